@@ -2,3 +2,4 @@ from .models import *
 from .core import *
 from .validator import *
 from .storage import *
+from .dedupe import *
@@ -0,0 +1,115 @@
+import re
+
+# Words that mark the street part of an address
+STREET_WORDS = {
+    'st', 'str', 'street', 'ave', 'av', 'avenue', 'avenu', 'rd', 'road', 'blvd',
+    'boulevard', 'ln', 'lane', 'dr', 'drive', 'sq', 'square', 'pl', 'place',
+    'way', 'hwy', 'highway', 'vul', 'vulytsia', 'prosp', 'prospekt', 'pr',
+    'вул', 'вулиця', 'просп', 'проспект', 'пров', 'провулок', 'бульв', 'бульвар', 'пл', 'площа',
+}
+# Prefixes written before a city name ("м. Київ", "city of Lviv")
+CITY_PREFIXES = re.compile(r'^(?:м\.|г\.|місто|city of|city)\s*', re.IGNORECASE)
+POSTCODE = re.compile(
+    r'\b(?:\d{5}(?:-\d{4})?|[A-Z]{1,2}\d[A-Z\d]?\s?\d[A-Z]{2})\b', re.IGNORECASE)
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Splits text into lowercase word tokens."""
+    return WORD.findall(text.casefold())
+
+
+def _is_street(part):
+    words = tokenize(part)
+    return any(ch.isdigit() for ch in part) or any(word in STREET_WORDS for word in words)
+
+
+def parse_address(text):
+    """
+    Splits a free-text address into street, city and postcode using simple heuristics.
+    Parts are separated by commas; the street is the first part with a house number
+    or a street word, the city is the first other part after it.
+    Returns a dict with the parts (None when not found) and the search tokens.
+    """
+    postcode_match = POSTCODE.search(text)
+    postcode = postcode_match.group(0).upper() if postcode_match else None
+    parts = []
+    for part in re.split(r'[,;\n]', text):
+        if postcode:
+            part = part.replace(postcode_match.group(0), '')
+        part = ' '.join(part.split())
+        if part:
+            parts.append(part)
+
+    street_index = next((i for i, part in enumerate(parts) if _is_street(part)), None)
+    others = [i for i in range(len(parts)) if i != street_index]
+    after_street = [i for i in others if street_index is not None and i > street_index]
+    if after_street:
+        city_index = after_street[0]
+    elif others:
+        city_index = others[0] if street_index is None else others[-1]
+    else:
+        city_index = None
+
+    city = None
+    if city_index is not None:
+        city = CITY_PREFIXES.sub('', parts[city_index]).strip() or None
+    return {
+        'street': parts[street_index] if street_index is not None else None,
+        'city': city.casefold() if city else None,
+        'postcode': postcode,
+        'tokens': sorted(set(tokenize(text))),
+    }
+
+
+class AddressIndex:
+    """
+    Inverted index over contact addresses.
+    Maps every address token to the names of the contacts using it,
+    and every city and postcode to the contacts located there.
+    """
+
+    def __init__(self):
+        self.tokens = {}
+        self.cities = {}
+        self.postcodes = {}
+
+    def add(self, name, parsed):
+        if not parsed:
+            return
+        for token in parsed['tokens']:
+            self.tokens.setdefault(token, set()).add(name)
+        if parsed['city']:
+            self.cities.setdefault(parsed['city'], set()).add(name)
+        if parsed['postcode']:
+            self.postcodes.setdefault(parsed['postcode'], set()).add(name)
+
+    def remove(self, name, parsed):
+        if not parsed:
+            return
+        for token in parsed['tokens']:
+            self._discard(self.tokens, token, name)
+        if parsed['city']:
+            self._discard(self.cities, parsed['city'], name)
+        if parsed['postcode']:
+            self._discard(self.postcodes, parsed['postcode'], name)
+
+    @staticmethod
+    def _discard(index, key, name):
+        names = index.get(key)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del index[key]
+
+    def search(self, query):
+        """Returns the names whose address contains every token of the query."""
+        tokens = tokenize(query)
+        if not tokens:
+            return set()
+        sets = sorted((self.tokens.get(token, set()) for token in tokens), key=len)
+        return set(sets[0]).intersection(*sets[1:])
+
+    def by_city(self):
+        """Returns {city: names} ordered from the largest city down."""
+        return dict(sorted(self.cities.items(), key=lambda item: (-len(item[1]), item[0])))
@@ -0,0 +1,120 @@
+from assistant.models import Birthday, Email
+from assistant.scan import SCANNER
+
+# Fields set-field-all can change; a value of '-' clears the field
+FIELDS = ('email', 'address', 'note', 'birthday')
+CLEAR = '-'
+
+
+def select(book, query):
+    """
+    Resolves the contacts a bulk command applies to, once.
+    'tag:<tag>' and 'city:<city>' are answered from the indexes,
+    any other query matches like search does.
+    """
+    kind, _, value = query.partition(':')
+    if kind == 'tag' and value:
+        names = book.indexes.with_tag(value)
+    elif kind == 'city' and value:
+        names = book.addresses.cities.get(value.casefold(), set())
+    else:
+        return SCANNER.search(book, query)
+    return [book.data[name] for name in sorted(names)]
+
+
+def _plan(records, current, target):
+    """Returns (record, before, after) for the records the change would alter."""
+    changes = []
+    for record in records:
+        before, after = current(record), target(record)
+        if before != after:
+            changes.append((record, before, after))
+    return changes
+
+
+def _describe(changes):
+    return [{'name': record.name.value, 'before': before, 'after': after}
+            for record, before, after in changes]
+
+
+def tag_all(book, query, tag, dry_run=False):
+    """
+    Adds a tag to every matching contact.
+    Returns the number of matching contacts and the changes made, or that would be made.
+    """
+    tag = tag.lower()
+    records = select(book, query)
+    changes = _plan(records, lambda record: sorted(record.tags), lambda record: sorted(record.tags | {tag}))
+    if not dry_run:
+        for record, _, _ in changes:
+            record.add_tags(tag)
+    return len(records), _describe(changes)
+
+
+def untag_all(book, query, tag, dry_run=False):
+    """Removes a tag from every matching contact."""
+    tag = tag.lower()
+    records = select(book, query)
+    changes = _plan(records, lambda record: sorted(record.tags), lambda record: sorted(record.tags - {tag}))
+    if not dry_run:
+        for record, _, _ in changes:
+            record.remove_tag(tag)
+    return len(records), _describe(changes)
+
+
+def delete_all(book, query, dry_run=False):
+    """Deletes every matching contact."""
+    records = select(book, query)
+    changes = [(record, record.name.value, None) for record in records]
+    if not dry_run:
+        for record, _, _ in changes:
+            book.delete_record(record.name.value)
+    return len(records), _describe(changes)
+
+
+def _field_value(record, field):
+    value = getattr(record, field)
+    if field == 'email' and value is not None:
+        return value.value
+    if field == 'birthday' and value is not None:
+        return str(value)
+    return value or None
+
+
+def set_field_all(book, query, field, value, dry_run=False):
+    """
+    Sets or clears a field of every matching contact.
+    The value is validated once, before any contact is changed.
+    """
+    field = field.lower()
+    if field not in FIELDS:
+        raise ValueError(f"Field must be one of: {', '.join(FIELDS)}")
+    value = None if value == CLEAR else value
+    if value is not None and field == 'email':
+        value = Email(value).value
+    elif value is not None and field == 'birthday':
+        value = str(Birthday(value))
+
+    records = select(book, query)
+    changes = _plan(records, lambda record: _field_value(record, field), lambda record: value)
+    if not dry_run:
+        for record, _, _ in changes:
+            _set_field(record, field, value)
+    return len(records), _describe(changes)
+
+
+def _set_field(record, field, value):
+    """Sets or clears one field through the Record methods, so the indexes follow."""
+    if field == 'email':
+        if value:
+            record.set_email(value)
+        else:
+            record.remove_email()
+    elif field == 'address':
+        record.set_address(value)
+    elif field == 'note':
+        record.edit_note(value or '')
+    elif value:
+        record.add_birthday(value)
+    else:
+        record.remove_birthday()
@@ -0,0 +1,93 @@
+import threading
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+
+# Stamp of records saved before modification times were kept
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_clock_lock = threading.Lock()
+_last_stamp = EPOCH
+
+
+def stamp():
+    """
+    Returns the current UTC time, strictly later than any stamp given before,
+    so that two changes never share a stamp and always sort in order.
+    """
+    global _last_stamp
+    with _clock_lock:
+        now = datetime.now(timezone.utc)
+        if now <= _last_stamp:
+            now = _last_stamp + timedelta(microseconds=1)
+        _last_stamp = now
+        return now
+
+
+def advance_clock(when):
+    """
+    Makes every later stamp come after the given one.
+    Called with the latest stamp of a loaded book, in case this clock is
+    behind the one that wrote it.
+    """
+    global _last_stamp
+    if when is None:
+        return
+    with _clock_lock:
+        if when > _last_stamp:
+            _last_stamp = when
+
+
+def parse_stamp(text):
+    """Parses an ISO 8601 time; times without an offset are taken as local time."""
+    try:
+        value = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid time '{text}', use ISO 8601, e.g. 2024-05-01T12:00:00+00:00")
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.astimezone(timezone.utc)
+
+
+class ChangeLog:
+    """
+    Ordered index of the last change of every contact, live or deleted.
+    Changes are appended in stamp order; an earlier entry of a contact that
+    changed again is left in place and skipped, until the log is compacted.
+    Listing the changes since a time costs O(log N + changes since).
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.latest = {}
+        self.ordered = True
+
+    def touch(self, name, when):
+        """Records that a contact changed (or was deleted) at the given time."""
+        if self.entries and when < self.entries[-1][0]:
+            self.ordered = False
+        self.entries.append((when, name))
+        self.latest[name] = when
+        if len(self.entries) > 2 * len(self.latest) + 1024:
+            self.compact()
+
+    def compact(self):
+        """Keeps only the last change of every contact, in stamp order."""
+        self.entries = sorted((when, name) for name, when in self.latest.items())
+        self.ordered = True
+
+    def since(self, when=None):
+        """
+        Returns (stamp, name) of the contacts changed after the given time,
+        or of every contact when no time is given, oldest first.
+        """
+        if not self.ordered:
+            self.compact()
+        start = bisect_right(self.entries, when, key=itemgetter(0)) if when else 0
+        return [(stamp, name) for stamp, name in self.entries[start:] if self.latest.get(name) == stamp]
+
+    def last(self):
+        """Returns the stamp of the latest change, or None for an empty log."""
+        if not self.ordered:
+            self.compact()
+        return self.entries[-1][0] if self.entries else None
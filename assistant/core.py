@@ -1,6 +1,15 @@
+import json
 from datetime import datetime
-from colorama import init, Fore, Back, Style
 from assistant.models import Record
+from assistant.changes import parse_stamp
+from assistant.dedupe import find_duplicates, merge_records
+from assistant import bulk
+from assistant.perf import profile_report
+from assistant.results import ok, info, warning, error, FAILED, NOT_FOUND
+from assistant.scan import SCANNER
+from assistant.stats import book_stats
+from assistant.storage import verify_data
+from assistant import tags as tag_analytics
 from assistant.utils import exception_handler
 
 
@@ -13,7 +22,7 @@ def add_address(book, name, address):
     record = book.find_record(name)
     if record:
         record.set_address(address)
-        return Fore.GREEN + f'Address added to contact {name}' + Style.RESET_ALL
+        return ok(f'Address added to contact {name}')
     raise KeyError
 
 
@@ -26,7 +35,7 @@ def edit_address(book, name, new_address):
     record = book.find_record(name)
     if record:
         record.edit_address(new_address)
-        return Fore.GREEN + f'Address updated for contact {name}' + Style.RESET_ALL
+        return ok(f'Address updated for contact {name}')
     raise KeyError
 
 
@@ -39,7 +48,7 @@ def remove_address(book, name):
     record = book.find_record(name)
     if record:
         record.remove_address()
-        return Fore.GREEN + f'Address removed from contact {name}' + Style.RESET_ALL
+        return ok(f'Address removed from contact {name}')
     raise KeyError
 
 
@@ -52,7 +61,7 @@ def remove_phone(book, name, phone):
     record = book.find_record(name)
     if record:
         record.remove_phone(phone)
-        return Fore.GREEN + f"Phone number {phone} removed from contact {name}" + Style.RESET_ALL
+        return ok(f"Phone number {phone} removed from contact {name}")
     raise KeyError("Contact not found")
 
 
@@ -65,7 +74,7 @@ def add_contact(book, name, phone):
     record = book.find_record(name) or Record(name)
     record.add_phone(phone)
     book.add_record(record)
-    return Fore.GREEN + f'Contact {name} with number {phone} has been added' + Style.RESET_ALL
+    return ok(f'Contact {name} with number {phone} has been added')
 
 
 @exception_handler
@@ -77,7 +86,7 @@ def change_contact(book, name, old_phone, new_phone):
     record = book.find_record(name)
     if record:
         record.edit_phone(old_phone, new_phone)
-        return Fore.GREEN + f'Contact {name} updated' + Style.RESET_ALL
+        return ok(f'Contact {name} updated')
     raise KeyError  # 'Contact not found'
 
 
@@ -88,7 +97,7 @@ def edit_name(book, old_name, new_name):
     Moves the contact record to the new name in the address book.
     """
     book.rename_record(old_name, new_name)
-    return Fore.GREEN + f'Name changed from {old_name} to {new_name}' + Style.RESET_ALL
+    return ok(f'Name changed from {old_name} to {new_name}')
 
 
 @exception_handler
@@ -100,7 +109,7 @@ def add_note(book, name, note):
     record = book.find_record(name)
     if record:
         record.add_note(note)
-        return Fore.GREEN + f'Note added to contact {name}' + Style.RESET_ALL
+        return ok(f'Note added to contact {name}')
     raise KeyError
 
 
@@ -113,7 +122,7 @@ def edit_note(book, name, note):
     record = book.find_record(name)
     if record:
         record.edit_note(note)
-        return Fore.GREEN + f'Note updated for contact {name}' + Style.RESET_ALL
+        return ok(f'Note updated for contact {name}')
     raise KeyError
 
 
@@ -126,7 +135,7 @@ def remove_note(book, name):
     record = book.find_record(name)
     if record:
         record.remove_note()
-        return Fore.GREEN + f'Note removed from contact {name}' + Style.RESET_ALL
+        return ok(f'Note removed from contact {name}')
     raise KeyError
 
 
@@ -137,8 +146,8 @@ def show_note(book, name):
     """
     record = book.find_record(name)
     if record and record.note:
-        return f'Note for {name}: {record.note}'
-    return Fore.YELLOW + 'Note not found' + Style.RESET_ALL
+        return info(f'Note for {name}: {record.note}', data={'name': name, 'note': record.note})
+    return warning('Note not found')
 
 
 def show_phone(book, name):
@@ -149,31 +158,23 @@ def show_phone(book, name):
     record = book.find_record(name)
     if record:
         if record.phones:
-            return ', '.join(phone.value for phone in record.phones)
-        return Fore.YELLOW + 'No phone numbers found for this contact' + Style.RESET_ALL
-    return Fore.YELLOW + 'Contact was not found' + Style.RESET_ALL
+            phones = [phone.value for phone in record.phones]
+            return info(', '.join(phones), data={'name': name, 'phones': phones})
+        return warning('No phone numbers found for this contact')
+    return warning('Contact was not found')
 
 
+@exception_handler
 def search_contacts(book, query):
     """
     Searches for contacts in the address book by name, phone number, email, or notes.
+    Large books are scanned in parallel.
     Returns a list of matching contacts or raises an error if no matches are found.
     """
-    query_lower = query.lower()
-    results = []
-
-    for record in book.data.values():
-        name_match = query_lower in record.name.value.lower()
-        phone_match = any(query_lower in str(phone.value).lower()
-                          for phone in record.phones)
-        email_match = record.email and query_lower in record.email.value.lower()
-        note_match = query_lower in record.note.lower() if record.note else False
-
-        if name_match or phone_match or email_match or note_match:
-            results.append(str(record))
+    results = SCANNER.search(book, query, 'contacts')
 
     if results:
-        return "\n".join(results)
+        return info(records=results)
 
     raise KeyError("Contact not found")
 
@@ -183,7 +184,9 @@ def show_all(book):
     Displays all contacts in the address book.
     Returns a message if the address book is empty.
     """
-    return str(book) if book else 'The contact list is empty'
+    if book:
+        return info(records=list(book.data.values()))
+    return info('The contact list is empty')
 
 
 @exception_handler
@@ -194,7 +197,7 @@ def delete_contact(book, name):
     """
     if book.find_record(name):
         book.delete_record(name)
-        return Fore.GREEN + f'Contact {name} was deleted' + Style.RESET_ALL
+        return ok(f'Contact {name} was deleted')
     raise KeyError  # 'Contact not found'
 
 
@@ -209,7 +212,7 @@ def add_birthday_to_contact(book, name, birthday_str):
         record = Record(name)
         book.add_record(record)
     record.add_birthday(birthday_str)
-    return Fore.GREEN + f'Birthday {birthday_str} added to contact {name}' + Style.RESET_ALL
+    return ok(f'Birthday {birthday_str} added to contact {name}')
 
 
 @exception_handler
@@ -217,7 +220,7 @@ def set_email(book, name, email):
     record = book.find_record(name)
     if record:
         record.set_email(email)
-        return Fore.GREEN + f"Email {email} added to contact {name}" + Style.RESET_ALL
+        return ok(f"Email {email} added to contact {name}")
     raise KeyError("Contact not found")
 
 
@@ -226,7 +229,7 @@ def edit_email(book, name, new_email):
     record = book.find_record(name)
     if record:
         record.set_email(new_email)
-        return Fore.GREEN + f"Email {new_email} added to contact {name}" + Style.RESET_ALL
+        return ok(f"Email {new_email} added to contact {name}")
     raise KeyError("Contact not found")
 
 
@@ -240,9 +243,9 @@ def remove_email(book, name):
     if record:
         try:
             record.remove_email()
-            return Fore.GREEN + f"Email removed for contact {name}" + Style.RESET_ALL
+            return ok(f"Email removed for contact {name}")
         except ValueError as e:
-            return Fore.YELLOW + f"Warning: {e}" + Style.RESET_ALL
+            return warning(f"Warning: {e}")
     raise KeyError("Contact not found")
 
 
@@ -253,8 +256,14 @@ def show_birthday(book, name):
     """
     record = book.find_record(name)
     if record and record.birthday:
-        return f"{record.name.value}'s birthday is {record.birthday}"
-    return 'Birthday is not set for this contact'
+        return info(f"{record.name.value}'s birthday is {record.birthday}",
+                    data={'name': record.name.value, 'birthday': str(record.birthday)})
+    return info('Birthday is not set for this contact')
+
+
+def _format_birthdays(data):
+    for item in data:
+        yield None, f"{item['name']}: {item['birthday']} (in {item['days_left']} days)"
 
 
 def upcoming_birthday(book):
@@ -262,35 +271,29 @@ def upcoming_birthday(book):
     Displays a list of contacts with upcoming birthdays within the next 7 days.
     Returns a message if no upcoming birthdays are found.
     """
-    list_bday = book.upcoming_birthday()
+    list_bday = book.upcoming_birthdays()
     if not list_bday:
-        return 'No upcoming birthday in the next week'
+        return info('No upcoming birthday in the next week')
     today = datetime.now().date()
-    lines = []
-    for record in list_bday:
-        bday_this_year = record.birthday.value.replace(year=today.year)
-        if bday_this_year < today:
-            bday_this_year = record.birthday.value.replace(year=today.year + 1)
-        days_left = (bday_this_year - today).days
-        lines.append(
-            f'{record.name.value}: {record.birthday} (in {days_left} days)')
-    return '\n'.join(lines)
+    birthdays = []
+    for day, record in list_bday:
+        birthdays.append({
+            'name': record.name.value,
+            'birthday': str(record.birthday),
+            'days_left': (day - today).days,
+        })
+    return info(data=birthdays, formatter=_format_birthdays)
 
 
 def search_notes(book, query):
     '''
     search for contacts with tags
     '''
-    results = []
-    for record in book.data.values():
-        note_text = record.note.lower()
-        tag_list = [t.lower() for t in record.tags]
-        if query.lower() in note_text or query.lower() in ' '.join(tag_list):
-            results.append(record)
+    results = SCANNER.search(book, query, 'notes')
 
     if results:
-        return '\n'.join(str(r) for r in results)
-    return Fore.YELLOW + 'No tags found matching your query' + Style.RESET_ALL
+        return info(records=results)
+    return warning('No tags found matching your query')
 
 
 @exception_handler
@@ -302,7 +305,20 @@ def add_tags(book, name, *tags):
     if not record:
         raise KeyError
     record.add_tags(*tags)
-    return Fore.GREEN + f"Tags added to {name}: {', '.join(tags)}" + Style.RESET_ALL
+    message = f"Tags added to {name}: {', '.join(tags)}"
+    if not tag_analytics.available():
+        return ok(message)
+    suggestions = book.tag_analytics.suggest({tag.lower() for tag in tags}, exclude=record.tags)
+    data = [{'tag': other, 'because': tag, 'share': share} for other, tag, share in suggestions]
+    if not data:
+        return ok(message)
+    return ok(message, data={'suggestions': data}, formatter=_format_suggestions)
+
+
+def _format_suggestions(data):
+    for item in data['suggestions']:
+        yield 'label', (f"Contacts tagged '{item['because']}' are usually also tagged "
+                       f"'{item['tag']}' ({item['share']:.0%})")
 
 
 @exception_handler
@@ -314,9 +330,9 @@ def remove_tags(book, name, tag):
     if not record:
         raise KeyError
     if tag.lower() not in record.tags:
-        return Fore.YELLOW + f"Tag '{tag}' not found for {name}" + Style.RESET_ALL
+        return warning(f"Tag '{tag}' not found for {name}")
     record.remove_tag(tag)
-    return Fore.GREEN + f"Tag '{tag}' removed form {name}" + Style.RESET_ALL
+    return ok(f"Tag '{tag}' removed form {name}")
 
 
 @exception_handler
@@ -324,16 +340,77 @@ def show_tags(book, name):
     record = book.find_record(name)
     if not record:
         raise KeyError
-    return f"Tags for {name}: {record.show_tags()}"
+    return info(f"Tags for {name}: {record.show_tags()}", data={'name': name, 'tags': sorted(record.tags)})
 
 
 @exception_handler
 def search_by_tag(book, tag):
     tag = tag.lower()
-    result = [r for r in book.data.values() if tag in r.tags]
+    result = [book.data[name] for name in sorted(book.indexes.with_tag(tag))]
     if result:
-        return "\n".join(str(r) for r in result)
-    return Fore.YELLOW + f"No contacts found with tag '{tag}'"
+        return info(records=result)
+    return warning(f"No contacts found with tag '{tag}'")
+
+
+def _format_tag_stats(data):
+    yield 'header', "Tag                  Contacts"
+    for tag, count in data['frequencies'].items():
+        yield None, f"{tag:<20} {count}"
+    if data['matrix']['tags']:
+        tags = data['matrix']['tags']
+        width = max(len(tag) for tag in tags) + 2
+        yield 'header', "\nCo-occurrence"
+        yield 'header', ' ' * width + ''.join(f"{tag:>{width}}" for tag in tags)
+        for tag, row in zip(tags, data['matrix']['counts']):
+            yield None, f"{tag:<{width}}" + ''.join(f"{count:>{width}}" for count in row)
+
+
+@exception_handler
+def show_tag_stats(book, top='10'):
+    '''
+    Shows how many contacts use each tag and how often the most used tags appear together
+    '''
+    if not tag_analytics.available():
+        return error(FAILED, "Tag analytics need NumPy, install it with 'pip install numpy'")
+    top = int(top)
+    if top < 1:
+        raise ValueError("The number of tags must be at least 1")
+    analytics = book.tag_analytics
+    frequencies = analytics.frequencies(top)
+    if not frequencies:
+        return warning("No tags found in the notebook")
+    tags, counts = analytics.matrix(top)
+    data = {'frequencies': dict(frequencies), 'matrix': {'tags': tags, 'counts': counts}}
+    return info(data=data, formatter=_format_tag_stats)
+
+
+def _format_related_tags(data):
+    yield 'header', f"Contacts tagged '{data['tag']}' are also tagged:"
+    for item in data['related']:
+        yield None, f"  {item['tag']:<20} {item['contacts']:>6}  {item['share']:.0%}"
+
+
+@exception_handler
+def related_tags(book, tag):
+    '''
+    Lists the tags that most often appear together with a tag
+    '''
+    if not tag_analytics.available():
+        return error(FAILED, "Tag analytics need NumPy, install it with 'pip install numpy'")
+    tag = tag.lower()
+    related = book.tag_analytics.related(tag, top=10)
+    if not related:
+        return warning(f"No tags found together with '{tag}'")
+    data = {'tag': tag, 'related': [{'tag': other, 'contacts': both, 'share': share}
+                                    for other, both, share in related]}
+    return info(data=data, formatter=_format_related_tags)
+
+
+def _format_notes_by_tags(data):
+    for tag, entries in data.items():
+        yield 'header', f"\nTag: #{tag}"
+        for entry in entries:
+            yield None, f"- {entry['name']}: {entry['note']}"
 
 
 def sort_notes_by_tags(book):
@@ -341,17 +418,338 @@ def sort_notes_by_tags(book):
     Sorts notes by tags, displaying a list of contacts grouped by tegs
     '''
     tag_dict = {}
-    for record in book.data.values():
-        for tag in record.tags:
-            tag_dict.setdefault(tag, []).append(record)
+    for view in book.snapshot().ordered():
+        for tag in view.tags:
+            tag_dict.setdefault(tag, []).append(view)
 
     if not tag_dict:
-        return Fore.YELLOW + "No tags found in the notebook" + Style.RESET_ALL
+        return warning("No tags found in the notebook")
 
-    output = []
+    data = {}
     for tag in sorted(tag_dict):
-        output.append(Fore.BLUE + f"\nTag: #{tag}" + Style.RESET_ALL)
-        for record in tag_dict[tag]:
-            note = record.note if record else "No note"
-            output.append(f"- {record.name.value}: {note}")
-    return '\n'.join(output)
+        data[tag] = [{'name': view.name, 'note': view.note} for view in tag_dict[tag]]
+    return info(data=data, formatter=_format_notes_by_tags)
+
+
+def _format_duplicates(data):
+    for number, cluster in enumerate(data, 1):
+        yield 'header', f"Cluster {number}: {', '.join(cluster)}"
+    yield 'warning', ("Use 'dedupe merge' to merge all clusters "
+                      "or 'dedupe merge <name> <name> ...' to merge selected contacts")
+
+
+def show_duplicates(book):
+    '''
+    Lists clusters of contacts that share a name, phone or email
+    '''
+    clusters = find_duplicates(book)
+    if not clusters:
+        return ok("No duplicate contacts found")
+    return info(data=clusters, formatter=_format_duplicates)
+
+
+def _format_merges(data):
+    for merge in data:
+        yield 'ok', f"{', '.join(merge['merged'])} merged into {merge['into']}"
+
+
+@exception_handler
+def merge_duplicates(book, *names):
+    '''
+    Merges the given contacts into the first one,
+    or every duplicate cluster when no names are given
+    '''
+    names = list(dict.fromkeys(names))
+    if len(names) == 1:
+        raise ValueError("Give at least two different contacts to merge")
+    clusters = [list(names)] if names else find_duplicates(book)
+    if not clusters:
+        return ok("No duplicate contacts found")
+
+    merges = []
+    for cluster in clusters:
+        merged = merge_records(book, cluster)
+        merges.append({'into': merged.name.value, 'merged': cluster[1:]})
+    return ok(data=merges, formatter=_format_merges)
+
+
+def _format_bulk(data):
+    for change in data['changes']:
+        if change['after'] is None and data['action'] == 'delete':
+            yield None, f"  {change['name']}"
+        else:
+            yield None, f"  {change['name']}: {change['before']} -> {change['after']}"
+
+
+def _bulk_result(action, query, dry_run, matched, changes):
+    if not matched:
+        return warning(f"No contacts match '{query}'")
+    data = {'action': action, 'query': query, 'dry_run': dry_run, 'matched': matched, 'changes': changes}
+    if dry_run:
+        return info(f"Dry run: {action} would change {len(changes)} of {matched} matching contacts",
+                    data=data, formatter=_format_bulk)
+    return ok(f"{action.capitalize()}: changed {len(changes)} of {matched} matching contacts",
+              data=data, formatter=_format_bulk)
+
+
+@exception_handler
+def tag_all(book, query, tag, dry_run=False):
+    '''
+    Adds a tag to every contact matching the query
+    '''
+    return _bulk_result('tag', query, dry_run, *bulk.tag_all(book, query, tag, dry_run))
+
+
+@exception_handler
+def untag_all(book, query, tag, dry_run=False):
+    '''
+    Removes a tag from every contact matching the query
+    '''
+    return _bulk_result('untag', query, dry_run, *bulk.untag_all(book, query, tag, dry_run))
+
+
+@exception_handler
+def delete_all(book, query, dry_run=False):
+    '''
+    Deletes every contact matching the query
+    '''
+    return _bulk_result('delete', query, dry_run, *bulk.delete_all(book, query, dry_run))
+
+
+@exception_handler
+def set_field_all(book, query, field, value, dry_run=False):
+    '''
+    Sets or clears ('-') a field of every contact matching the query
+    '''
+    return _bulk_result(f'set {field}', query, dry_run, *bulk.set_field_all(book, query, field, value, dry_run))
+
+
+def _format_snapshot(data):
+    yield None, (f"Snapshot version {data['version']}, codec {data['codec']}, "
+                 f"{data['blocks']} blocks, {data['raw_bytes']} bytes of data "
+                 f"stored in {data['stored_bytes']} bytes")
+
+
+@exception_handler
+def verify_storage(filename='addressbook.pkl'):
+    '''
+    Checks the block checksums of a saved address book
+    '''
+    try:
+        data = verify_data(filename)
+    except FileNotFoundError:
+        return error(NOT_FOUND, f"File {filename} does not exist")
+    return ok(f"{filename} is intact", data=data, formatter=_format_snapshot)
+
+
+def _format_perf(data):
+    yield None, f"Slow command threshold: {data['slow_ms']:.0f} ms, log: {data['slow_log']}"
+    if data['profiling']:
+        yield 'warning', f"Profiling the next {data['profiling']} commands"
+    for section in ('commands', 'functions'):
+        if not data[section]:
+            continue
+        yield 'header', f"\n{section.capitalize():<20}{'calls':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'cpu p50':>9}"
+        for name, t in data[section].items():
+            yield None, (f"{name:<20}{t['calls']:>7}{t['p50_ms']:>9.2f}{t['p95_ms']:>9.2f}"
+                         f"{t['p99_ms']:>9.2f}{t['cpu_p50_ms']:>9.2f}")
+
+
+def show_perf(monitor):
+    '''
+    Shows latency percentiles (in ms) of the commands run so far
+    '''
+    data = monitor.stats()
+    if not data['commands']:
+        return info('No commands timed yet')
+    return info(data=data, formatter=_format_perf)
+
+
+@exception_handler
+def configure_perf(monitor, action, value=None):
+    '''
+    Changes the perf settings: reset, slow <ms>, profile <count> or report
+    '''
+    match action:
+        case 'reset':
+            monitor.reset()
+            return ok('Timings cleared')
+        case 'slow' if value is not None:
+            monitor.slow_ms = float(value)
+            return ok(f'Commands slower than {monitor.slow_ms:.0f} ms are logged to {monitor.log_file}')
+        case 'profile' if value is not None:
+            count = int(value)
+            if count < 1:
+                raise ValueError('Give the number of commands to profile')
+            monitor.profile(count)
+            return ok(f'Profiling the next {count} commands')
+        case 'report':
+            report = profile_report()
+            if report is None:
+                return warning("No profile captured yet, use 'perf profile <count>'")
+            return info(report, data={'report': report})
+    raise ValueError("Use 'perf', 'perf reset', 'perf slow <ms>', 'perf profile <count>' or 'perf report'")
+
+
+def _format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _format_stats(data):
+    yield 'header', 'Contents'
+    for name, value in data['counts'].items():
+        yield None, f"{name.replace('_', ' '):<20}{value:>12}"
+    yield 'header', '\nDistribution'
+    for name, values in data['distribution'].items():
+        spread = ', '.join(f"{key}: {value}" for key, value in values.items()) or '-'
+        yield None, f"{name.replace('_', ' '):<20}{spread}"
+    yield 'header', '\nMemory'
+    for name, size in data['memory_bytes'].items():
+        yield None, f"{name.replace('_', ' '):<20}{_format_size(size):>12}"
+    yield 'header', '\nStorage'
+    disk = _format_size(data['disk_bytes']) if data['disk_bytes'] is not None else 'not saved yet'
+    yield None, f"{'snapshot size':<20}{disk:>12}"
+    for name in ('last_load_seconds', 'last_save_seconds'):
+        seconds = data[name]
+        shown = f"{seconds * 1000:.1f} ms" if seconds is not None else '-'
+        yield None, f"{name[:-8].replace('_', ' '):<20}{shown:>12}"
+
+
+def show_stats(book, filename='addressbook.pkl', trace=False):
+    '''
+    Reports the size of the address book and where its memory goes
+    '''
+    return info(data=book_stats(book, filename, trace), formatter=_format_stats)
+
+
+def search_address(book, query):
+    '''
+    Finds contacts whose address contains every word of the query,
+    using the address index
+    '''
+    names = book.addresses.search(query)
+    if not names:
+        return warning(f"No contacts found at '{query}'")
+    return info(records=[book.data[name] for name in sorted(names)])
+
+
+def _format_cities(data):
+    for city, names in data.items():
+        yield 'header', f"{city.title()} ({len(names)})"
+        yield None, f"  {', '.join(names)}"
+
+
+def contacts_per_city(book, city=None):
+    '''
+    Groups contacts by the city of their address
+    '''
+    cities = book.addresses.by_city()
+    if city:
+        cities = {key: names for key, names in cities.items() if key == city.casefold()}
+    if not cities:
+        return warning("No cities found in the addresses")
+    data = {key: sorted(names) for key, names in cities.items()}
+    return info(data=data, formatter=_format_cities)
+
+
+@exception_handler
+def use_book(workspace, name):
+    '''
+    Switches to another address book, creating it if it does not exist
+    '''
+    book = workspace.use(name)
+    return ok(f"Using book {name} ({len(book)} contacts)", data={'book': name, 'contacts': len(book)})
+
+
+def _format_books(data):
+    for book in data:
+        marker = '*' if book['current'] else ' '
+        contacts = book['contacts'] if book['contacts'] is not None else 'not loaded'
+        yield 'header' if book['current'] else None, f"{marker} {book['name']:<20}{contacts}"
+
+
+def list_books(workspace):
+    '''
+    Lists the address books of the workspace, marking the current one
+    '''
+    books = []
+    for name in workspace.available():
+        book = workspace.books.get(name)
+        books.append({
+            'name': name,
+            'current': name == workspace.current_name,
+            'loaded': book is not None,
+            'contacts': len(book) if book is not None else None,
+        })
+    return info(data=books, formatter=_format_books)
+
+
+def _format_book_matches(data):
+    for name, names in data.items():
+        yield 'header', f"{name}: {', '.join(names)}"
+
+
+def search_all_books(workspace, query):
+    '''
+    Searches every book of the workspace, loading them one by one
+    '''
+    matches = {}
+    records = []
+    for name in workspace.available():
+        result = search_contacts(workspace.get(name), query)
+        if result.records:
+            matches[name] = [record.name.value for record in result.records]
+            records.extend(result.records)
+    if not records:
+        return error(NOT_FOUND, 'Contact not found')
+    return info(records=records, data=matches, formatter=_format_book_matches)
+
+
+def _format_changes(data):
+    yield 'header', f"{data['changed']} changed, {len(data['deleted'])} deleted since {data['since'] or 'the start'}"
+    for item in data['deleted']:
+        yield 'warning', f"  deleted {item['name']} at {item['deleted']}"
+    if data['until']:
+        yield None, f"Next sync: changes --since {data['until']}"
+
+
+@exception_handler
+def show_changes(book, since=None, export=None):
+    '''
+    Lists the contacts changed or deleted after a time, for incremental sync.
+    With export, the delta is written to a JSON file instead of being listed
+    '''
+    since = parse_stamp(since) if since else None
+    changed, deleted = book.changes_since(since)
+    last = book.indexes.changes.last()
+    data = {
+        'since': since.isoformat() if since else None,
+        'until': last.isoformat() if last else None,
+        'changed': len(changed),
+        'deleted': [{'name': name, 'deleted': when.isoformat()} for name, when in deleted],
+    }
+    if export:
+        with open(export, 'w', encoding='utf-8') as f:
+            json.dump(dict(data, changed=[record.to_dict() for record in changed]), f, ensure_ascii=False)
+        return ok(f"Exported {len(changed)} changed and {len(deleted)} deleted contacts to {export}", data=data)
+    if not changed and not deleted:
+        return info(f"No changes since {data['since'] or 'the start'}", data=data)
+    return info(records=changed, data=data, formatter=_format_changes)
+
+
+def _format_replication(data):
+    for name, value in data.items():
+        yield None, f"{name.replace('_', ' '):<20}{'-' if value is None else value}"
+
+
+def replication_status(workspace):
+    '''
+    Shows how far a follower is behind the primary it follows
+    '''
+    if not hasattr(workspace, 'status'):
+        return info("Not following a primary, start with --follow <path> to run a read replica")
+    return info(data=workspace.status(), formatter=_format_replication)
@@ -0,0 +1,115 @@
+import re
+
+
+# Phones are validated as 9-14 digits; the trailing 9 digits identify the
+# subscriber regardless of the country/trunk prefix the user typed.
+PHONE_KEY_DIGITS = 9
+
+
+def normalize_name(name):
+    """
+    Returns a comparison key for a contact name.
+    Case, punctuation and word order are ignored, so 'Doe, John' matches 'john doe'.
+    """
+    words = re.findall(r'\w+', name.lower())
+    return ' '.join(sorted(words))
+
+
+def normalize_phone(phone):
+    """Returns the trailing subscriber digits of a phone number."""
+    digits = ''.join(ch for ch in phone if ch.isdigit())
+    return digits[-PHONE_KEY_DIGITS:]
+
+
+def normalize_email(email):
+    """Returns a case-insensitive comparison key for an email address."""
+    return email.strip().lower()
+
+
+def record_keys(view):
+    """
+    Yields the bucket keys of a record view.
+    Two records sharing any key are considered duplicate candidates.
+    """
+    name_key = normalize_name(view.name)
+    if name_key:
+        yield ('name', name_key)
+    for phone in view.phones:
+        phone_key = normalize_phone(phone)
+        if phone_key:
+            yield ('phone', phone_key)
+    if view.email:
+        yield ('email', normalize_email(view.email))
+
+
+def find_duplicates(book):
+    """
+    Finds clusters of records that share a normalized name, phone or email.
+    Records are hashed into buckets by key and buckets are joined with a
+    union-find, so the work is linear in the number of keys.
+    Works on a snapshot of the book.
+    Returns a list of clusters, each a list of contact names in book order.
+    """
+    views = book.snapshot().ordered()
+    names = [view.name for view in views]
+    parent = list(range(len(names)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    first_seen = {}
+    for i, view in enumerate(views):
+        for key in record_keys(view):
+            j = first_seen.setdefault(key, i)
+            if j != i:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    clusters = {}
+    for i, name in enumerate(names):
+        clusters.setdefault(find(i), []).append(name)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+
+def merge_records(book, names):
+    """
+    Merges the given records into the first one.
+    Phones and tags are unioned, notes are concatenated, and the first
+    non-empty birthday, email and address are kept.
+    The other records are removed from the book. Returns the merged record.
+    """
+    names = list(dict.fromkeys(names))
+    records = [book.find_record(name) for name in names]
+    missing = [name for name, record in zip(names, records) if record is None]
+    if missing:
+        raise KeyError(missing[0])
+    target, others = records[0], records[1:]
+
+    seen_phones = {phone.value for phone in target.phones}
+    notes = [target.note] if target.note else []
+    for record in others:
+        for phone in record.phones:
+            if phone.value not in seen_phones:
+                seen_phones.add(phone.value)
+                target.add_phone(phone.value)
+        if record.tags:
+            target.add_tags(*record.tags)
+        if record.note and record.note not in notes:
+            notes.append(record.note)
+        if not target.birthday and record.birthday:
+            target.add_birthday(str(record.birthday))
+        if not target.email and record.email:
+            target.set_email(record.email.value)
+        if not target.address and record.address:
+            target.set_address(record.address)
+    note = '; '.join(notes)
+    if note != target.note:
+        target.edit_note(note)
+
+    for record in others:
+        book.delete_record(record.name.value)
+    return target
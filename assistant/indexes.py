@@ -0,0 +1,185 @@
+from bisect import bisect_left, insort
+from datetime import timedelta
+from assistant.address import AddressIndex
+from assistant.changes import EPOCH, ChangeLog
+
+# Bump when the layout of BookIndexes changes, so stored indexes are rebuilt
+INDEX_SCHEMA = 3
+# Target number of names per block of SortedNames
+NAME_BLOCK = 1024
+
+
+class SortedNames:
+    """
+    Sorted list of (casefolded name, name) keys, kept in blocks of about
+    NAME_BLOCK keys. Inserting or removing a key shifts one block only,
+    so it costs O(log N + NAME_BLOCK) instead of O(N).
+    """
+
+    def __init__(self, keys=()):
+        """Builds the list from keys that are already sorted."""
+        keys = list(keys)
+        self.blocks = [keys[i:i + NAME_BLOCK] for i in range(0, len(keys), NAME_BLOCK)]
+        self.maxes = [block[-1] for block in self.blocks]
+        self.count = len(keys)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for block in self.blocks:
+            yield from block
+
+    def add(self, key):
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            self.count += 1
+            return
+        i = min(bisect_left(self.maxes, key), len(self.blocks) - 1)
+        block = self.blocks[i]
+        insort(block, key)
+        self.maxes[i] = block[-1]
+        self.count += 1
+        if len(block) > 2 * NAME_BLOCK:
+            self.blocks[i:i + 1] = [block[:NAME_BLOCK], block[NAME_BLOCK:]]
+            self.maxes[i:i + 1] = [block[NAME_BLOCK - 1], block[-1]]
+
+    def remove(self, key):
+        """Removes a key, if present."""
+        i = bisect_left(self.maxes, key)
+        if i == len(self.blocks):
+            return
+        block = self.blocks[i]
+        position = bisect_left(block, key)
+        if position == len(block) or block[position] != key:
+            return
+        del block[position]
+        self.count -= 1
+        if block:
+            self.maxes[i] = block[-1]
+        else:
+            del self.blocks[i], self.maxes[i]
+
+    def irange(self, start):
+        """Yields the keys from the first one not less than start, in order."""
+        i = bisect_left(self.maxes, start)
+        if i == len(self.blocks):
+            return
+        block = self.blocks[i]
+        yield from block[bisect_left(block, start):]
+        for block in self.blocks[i + 1:]:
+            yield from block
+
+
+class BookIndexes:
+    """
+    Secondary indexes of an address book:
+    sorted names for prefix lookups, tags, birthdays by (month, day),
+    the address index and the log of changes ordered by time.
+    Maintained incrementally as records change and saved next to the
+    records so that loading does not rebuild them.
+    """
+
+    def __init__(self):
+        self.names = SortedNames()
+        self.tags = {}
+        self.birthdays = {}
+        self.addresses = AddressIndex()
+        self.changes = ChangeLog()
+
+    @classmethod
+    def build(cls, records, tombstones):
+        """
+        Builds the indexes of (name, record) pairs and of the (name, time)
+        of deleted contacts. Names are sorted once, in O(N log N).
+        """
+        indexes = cls()
+        keys = []
+        for name, record in records:
+            keys.append((name.casefold(), name))
+            indexes._add_fields(name, record)
+        keys.sort()
+        indexes.names = SortedNames(keys)
+        for name, deleted in tombstones:
+            indexes.changes.touch(name, deleted)
+        return indexes
+
+    def add(self, name, record):
+        self.names.add((name.casefold(), name))
+        self._add_fields(name, record)
+
+    def _add_fields(self, name, record):
+        for tag in record.tags:
+            self.tags.setdefault(tag, set()).add(name)
+        if record.birthday:
+            self.birthdays.setdefault(self._day(record.birthday), set()).add(name)
+        self.addresses.add(name, record.parsed_address())
+        self.changes.touch(name, record.modified or EPOCH)
+
+    def remove(self, name, record):
+        self.names.remove((name.casefold(), name))
+        for tag in record.tags:
+            self._discard(self.tags, tag, name)
+        if record.birthday:
+            self._discard(self.birthdays, self._day(record.birthday), name)
+        self.addresses.remove(name, record.parsed_address())
+
+    def update(self, name, record, field, old):
+        """Applies the change of one field; old is the previous value."""
+        if field == 'tags':
+            for tag in old - record.tags:
+                self._discard(self.tags, tag, name)
+            for tag in record.tags - old:
+                self.tags.setdefault(tag, set()).add(name)
+        elif field == 'birthday':
+            if old:
+                self._discard(self.birthdays, self._day(old), name)
+            if record.birthday:
+                self.birthdays.setdefault(self._day(record.birthday), set()).add(name)
+        elif field == 'address':
+            self.addresses.remove(name, old)
+            self.addresses.add(name, record.parsed_address())
+        self.changes.touch(name, record.modified or EPOCH)
+
+    @staticmethod
+    def _day(birthday):
+        return birthday.value.month, birthday.value.day
+
+    @staticmethod
+    def _discard(index, key, name):
+        names = index.get(key)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del index[key]
+
+    def with_prefix(self, prefix):
+        """Returns the names starting with the prefix, ignoring case."""
+        prefix = prefix.casefold()
+        result = []
+        for key, name in self.names.irange((prefix, '')):
+            if not key.startswith(prefix):
+                break
+            result.append(name)
+        return result
+
+    def with_tag(self, tag):
+        return self.tags.get(tag.lower(), set())
+
+    @staticmethod
+    def _is_leap(year):
+        return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+    def birthdays_between(self, start, days):
+        """Returns (date, names) for every day from start to start + days with birthdays."""
+        result = []
+        for offset in range(days + 1):
+            day = start + timedelta(days=offset)
+            names = self.birthdays.get((day.month, day.day), set())
+            if (day.month, day.day) == (3, 1) and not self._is_leap(day.year):
+                # Birthdays on 29 February are celebrated on 1 March in other years
+                names = names | self.birthdays.get((2, 29), set())
+            if names:
+                result.append((day, names))
+        return result
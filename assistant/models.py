@@ -1,9 +1,36 @@
+import itertools
 import re
+import threading
 from collections import UserDict
+from functools import wraps
 from datetime import datetime
 from assistant.validator import validate_phone, validate_birthday, validate_email
+from assistant.render import format_record
+from assistant.address import parse_address
+from assistant.indexes import INDEX_SCHEMA, BookIndexes
+from assistant.snapshot import SHARDS, BookSnapshot, RecordView, shard_of
+from assistant.tags import TagAnalytics
+from assistant.changes import advance_clock, stamp
 from colorama import init, Fore, Back, Style
 
+# Source of AddressBook.token; ids of freed books can be reused, tokens are not
+_book_tokens = itertools.count()
+
+
+class ReadOnlyError(Exception):
+    """Raised when a read-only address book, such as a follower's copy, is changed."""
+
+
+def _mutator(method):
+    """Refuses to run a Record method that changes the record if its book is read-only."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._book is not None and self._book.read_only:
+            raise ReadOnlyError('The address book is read-only')
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
 # Base class for fields like Name, Phone, Birthday, etc.
 
 
@@ -43,8 +70,17 @@ class Record:
     """
     Represents a single contact record in the address book.
     Contains fields such as name, phones, birthday, email, notes, and address.
+    Changes are reported to the address book the record belongs to,
+    so that its indexes stay up to date.
     """
 
+    # Defaults for records pickled before these attributes existed
+    _book = None
+    address_parts = None
+    position = None
+    created = None
+    modified = None
+
     def __init__(self, name, email=None, address=None):
         self.name = Name(name)
         self.phones = []
@@ -53,28 +89,59 @@ class Record:
         self.email = Email(email) if email else None
         self.tags = set()
         self.address = address
+        self.address_parts = parse_address(address) if address else None
+
+    def _changed(self, field, old=None):
+        """Stamps the modification time and notifies the owning address book."""
+        self.modified = stamp()
+        if self._book is not None:
+            self._book.record_changed(self, field, old)
 
+    @_mutator
     def set_address(self, address):
         """Sets the address for the contact."""
+        old = self.parsed_address()
         self.address = address
+        self.address_parts = parse_address(address) if address else None
+        self._changed('address', old)
+
+    def parsed_address(self):
+        """Returns the street, city, postcode and tokens of the address, parsing it on first use."""
+        if self.address and self.address_parts is None:
+            self.address_parts = parse_address(self.address)
+        return self.address_parts
 
     def edit_address(self, new_address):
         """Edits the address of the contact."""
-        self.address = new_address
+        self.set_address(new_address)
 
     def remove_address(self):
         """Removes the address from the contact."""
-        self.address = None
+        self.set_address(None)
 
+    @_mutator
     def add_phone(self, phone):
         """Adds a phone number to the contact."""
         validated_phone = validate_phone(phone)
+        old = list(self.phones)
         self.phones.append(Phone(validated_phone))
+        self._changed('phones', old)
 
+    @_mutator
     def add_birthday(self, birthday_str):
         """Adds a birthday to the contact."""
+        old = self.birthday
         self.birthday = Birthday(birthday_str)
+        self._changed('birthday', old)
+
+    @_mutator
+    def remove_birthday(self):
+        """Removes the birthday from the contact."""
+        old = self.birthday
+        self.birthday = None
+        self._changed('birthday', old)
 
+    @_mutator
     def remove_phone(self, phone):
         """
         Removes a phone number from the contact.
@@ -82,16 +149,21 @@ class Record:
         """
         for i, k in enumerate(self.phones):
             if k.value == phone:
+                old = list(self.phones)
                 del self.phones[i]
+                self._changed('phones', old)
                 return
         raise ValueError(f"Phone number {phone} not found.")
 
+    @_mutator
     def edit_phone(self, old_phone, new_phone):
         """Edits an existing phone number."""
         for i, k in enumerate(self.phones):
             if k.value == old_phone:
                 validated_phone = validate_phone(new_phone)
+                old = list(self.phones)
                 self.phones[i] = Phone(validated_phone)
+                self._changed('phones', old)
                 return
         raise ValueError('Phone not found')
 
@@ -99,73 +171,130 @@ class Record:
         """Finds a phone number in the contact."""
         return next((k for k in self.phones if k.value == phone), None)
 
+    @_mutator
     def set_email(self, email_str: str):
         """Sets an email address for the contact."""
+        old = self.email
         self.email = Email(email_str)
+        self._changed('email', old)
 
     def edit_email(self, new_email_str: str):
         """Edits the email address of the contact."""
-        self.email = Email(new_email_str)
+        self.set_email(new_email_str)
 
+    @_mutator
     def remove_email(self):
         """Removes the email address from the contact."""
         if self.email is None:
             raise ValueError('Email is alredy removed or not set')
+        old = self.email
         self.email = None
+        self._changed('email', old)
 
+    @_mutator
     def edit_name(self, new_name):
         """Edits the name of the contact."""
+        old = self.name
         self.name = Name(new_name)
+        self._changed('name', old)
 
     def add_note(self, note):
         """Adds a note to the contact."""
-        self.note = note
+        self.edit_note(note)
 
+    @_mutator
     def edit_note(self, note):
         """Edits the note of the contact."""
+        old = self.note
         self.note = note
+        self._changed('note', old)
 
     def remove_note(self):
         """Removes the note from the contact."""
-        self.note = ''
+        self.edit_note('')
 
     def show_note(self):
         """Returns the note of the contact."""
         return self.note
 
+    @_mutator
     def add_tags(self, *tags):
+        old = set(self.tags)
         self.tags.update(tag.lower() for tag in tags)
+        self._changed('tags', old)
 
+    @_mutator
     def remove_tag(self, tag):
+        old = set(self.tags)
         self.tags.discard(tag.lower())
+        self._changed('tags', old)
 
     def show_tags(self):
         return ', '.join(sorted(self.tags)) if self.tags else "No tags"
 
+    def freeze(self):
+        """Returns an immutable copy of the record for snapshots."""
+        return RecordView(
+            self.name.value,
+            tuple(phone.value for phone in self.phones),
+            self.birthday.value if self.birthday else None,
+            self.email.value if self.email else None,
+            self.note,
+            frozenset(self.tags),
+            self.address,
+            self.position,
+            self.created,
+            self.modified,
+        )
+
+    @classmethod
+    def from_view(cls, view):
+        """
+        Creates a record from a snapshot view without validating it again.
+        The address is parsed only when it is first needed.
+        """
+        record = cls(view.name)
+        record.address = view.address
+        record.phones = [Phone(phone) for phone in view.phones]
+        if view.birthday:
+            record.birthday = Birthday.__new__(Birthday)
+            Field.__init__(record.birthday, view.birthday)
+        if view.email:
+            record.email = Email.__new__(Email)
+            record.email._value = view.email
+        record.note = view.note
+        record.tags = set(view.tags)
+        record.position = view.position
+        record.created = view.created
+        record.modified = view.modified
+        return record
+
+    def __getstate__(self):
+        # The owning book re-attaches its records when it is unpickled
+        state = self.__dict__.copy()
+        state.pop('_book', None)
+        return state
+
+    def to_dict(self):
+        """Returns the contact as plain data for machine-readable output."""
+        return {
+            'name': self.name.value,
+            'phones': [phone.value for phone in self.phones],
+            'birthday': str(self.birthday) if self.birthday else None,
+            'email': self.email.value if self.email else None,
+            'note': self.note,
+            'address': self.address,
+            'tags': sorted(self.tags),
+            'created': self.created.isoformat() if self.created else None,
+            'modified': self.modified.isoformat() if self.modified else None,
+        }
+
     def __str__(self):
         """
         Returns a string representation of the contact,
         including name, phones, birthday, email, notes, and address.
         """
-        phone_str = ', '.join(str(k)
-                              for k in self.phones) if self.phones else '📵 No phones'
-        bday_str = f'🎂 Birthday:{Style.RESET_ALL}{self.birthday}' if self.birthday else '🎂 Birthday: Not set'
-        note_str = f'📝 Note: {Style.RESET_ALL}{self.note}' if self.note else '📝 Note: Not set'
-        email_str = f'✉️  Email:{Style.RESET_ALL}{self.email.value}' if self.email else '✉️  Email: Not set'
-        address_str = f'🏠 Address: {Style.RESET_ALL}{self.address}' if self.address else '🏠 Address: Not set'
-        tags_str = f'Tags: {self.show_tags()}' if self.tags else 'Tags: Not set'
-
-        return (
-            f"{Fore.CYAN}{'.' * 50}{Style.RESET_ALL}\n"
-            f"👤{Fore.CYAN} Contact name:{Style.RESET_ALL} {self.name} \n"
-            f"📞{Fore.CYAN} Phones:{Style.RESET_ALL} {phone_str}\n"
-            f"{Fore.CYAN}{bday_str}{Style.RESET_ALL}\n"
-            f"{Fore.CYAN}{email_str}{Style.RESET_ALL}\n"
-            f"{Fore.CYAN}{note_str}{Style.RESET_ALL}\n"
-            f"{Fore.CYAN}{address_str}{Style.RESET_ALL}\n"
-            f"{Fore.CYAN}{tags_str}{Style.RESET_ALL}\n"
-            f"{Fore.CYAN}{'.' * 50}{Style.RESET_ALL}\n"
-        )
+        return format_record(self)
 
 
 class Email:
@@ -195,11 +324,236 @@ class AddressBook(UserDict):
     """
     Represents the address book, which is a collection of contact records.
     Inherits from UserDict to provide dictionary-like behavior.
+    Keeps secondary indexes in sync with the records it holds.
     """
 
+    # Incremented on every change, so cached views of the book can tell they are stale
+    version = 0
+    # Set on copies that only apply changes replicated from another instance
+    read_only = False
+
+    def __init__(self, *args, **kwargs):
+        self._init_state()
+        super().__init__(*args, **kwargs)
+
+    def _init_state(self):
+        """Sets up the attributes that are not pickled with the book."""
+        self.indexes = BookIndexes()
+        # Identifies this book instance for caches keyed by book
+        self.token = next(_book_tokens)
+        # Built on first use by tag_analytics, then kept up to date
+        self._tags = None
+        self.__dict__.setdefault('next_position', 0)
+        # Names of deleted contacts and when they were deleted
+        self.__dict__.setdefault('tombstones', {})
+        # Copy-on-write shards of record views, created by the first snapshot()
+        self._shards = None
+        self._shared = None
+        self._published = None
+        self._tombstones_changed = True
+        self._publish_lock = threading.Lock()
+
+    def __setitem__(self, name, record):
+        self._check_writable()
+        if self.data.get(name) is record:
+            return
+        record.modified = stamp()
+        if record.created is None:
+            record.created = record.modified
+        self._put(name, record)
+
+    def __delitem__(self, name):
+        self._check_writable()
+        if name not in self.data:
+            raise KeyError(name)
+        self._drop(name, stamp())
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyError('The address book is read-only')
+
+    def _put(self, name, record):
+        existing = self.data.get(name)
+        if existing is not None:
+            self._unindex(name, existing)
+        self.data[name] = record
+        self._index(name, record)
+        self._touched(name, record)
+
+    def _drop(self, name, deleted):
+        record = self.data.pop(name, None)
+        if record is not None:
+            self._unindex(name, record)
+        self.indexes.changes.touch(name, deleted)
+        self._touched(name, None, deleted)
+
+    def apply_changes(self, views, deleted):
+        """
+        Applies changes copied from another instance of the book, keeping their times.
+        views are the RecordView of the changed records, deleted the (name, time)
+        of the deleted ones. Allowed on read-only books, which receive changes this way.
+        """
+        for view in views:
+            self._put(view.name, Record.from_view(view))
+            if view.position is not None and view.position >= self.next_position:
+                self.next_position = view.position + 1
+        for name, when in deleted:
+            self._drop(name, when)
+        advance_clock(self.indexes.changes.last())
+
+    @property
+    def addresses(self):
+        return self.indexes.addresses
+
+    @property
+    def tag_analytics(self):
+        """Tag frequencies and co-occurrence of the book; needs NumPy."""
+        if self._tags is None:
+            self._tags = TagAnalytics.from_book(self)
+        return self._tags
+
+    def _attach(self, record):
+        record._book = self
+        if record.position is None:
+            record.position = self.next_position
+            self.next_position += 1
+
+    def _index(self, name, record):
+        self._attach(record)
+        self.indexes.add(name, record)
+        if self._tags is not None:
+            self._tags.add(name, record.tags)
+
+    def _unindex(self, name, record):
+        record._book = None
+        self.indexes.remove(name, record)
+        if self._tags is not None:
+            self._tags.remove(name, record.tags)
+
+    def record_changed(self, record, field, old):
+        """Updates the indexes after a field of a record has changed."""
+        name = record.name.value
+        self.indexes.update(name, record, field, old)
+        if field == 'tags' and self._tags is not None:
+            self._tags.update(name, record.tags, old)
+        self._touched(name, record)
+
+    def _touched(self, name, record, deleted=None):
+        """
+        Bumps the version and updates the record's view in the shards,
+        copying the shard first if a published snapshot still uses it.
+        A deleted record leaves a tombstone with the time of deletion.
+        """
+        with self._publish_lock:
+            if record is None:
+                self.tombstones[name] = deleted
+                self._tombstones_changed = True
+            elif name in self.tombstones:
+                del self.tombstones[name]
+                self._tombstones_changed = True
+            if self._shards is not None:
+                index = shard_of(name)
+                if self._shared[index]:
+                    self._shards[index] = dict(self._shards[index])
+                    self._shared[index] = False
+                if record is None:
+                    self._shards[index].pop(name, None)
+                else:
+                    self._shards[index][name] = record.freeze()
+            self.version += 1
+
+    def snapshot(self):
+        """
+        Returns an immutable point-in-time view of the book.
+        Scans, dedupe and stats read from it, so the book can keep changing
+        while they run. Publishing is O(number of shards); consecutive calls
+        without changes in between return the same snapshot.
+        """
+        with self._publish_lock:
+            if self._shards is None:
+                self._shards = [{} for _ in range(SHARDS)]
+                self._shared = [False] * SHARDS
+                # Copied in one step, writers may be changing the dict meanwhile
+                for name, record in list(self.data.items()):
+                    self._shards[shard_of(name)][name] = record.freeze()
+            published = self._published
+            if published is None or published.version != self.version:
+                shards = tuple(self._shards)
+                tombstones = published.tombstones if published is not None else {}
+                if self._tombstones_changed:
+                    tombstones = dict(self.tombstones)
+                    self._tombstones_changed = False
+                published = BookSnapshot(shards, self.version, sum(map(len, shards)), tombstones)
+                self._shared = [True] * SHARDS
+                self._published = published
+            return published
+
+    def index_stamp(self):
+        """Identifies the state of the book the current indexes belong to."""
+        return {'schema': INDEX_SCHEMA, 'version': self.version, 'count': len(self.data)}
+
+    @classmethod
+    def from_snapshot(cls, snapshot, indexes=None, stamp=None):
+        """
+        Creates a book from a snapshot, sharing its shards until the first change.
+        Stored indexes are used as they are when their stamp matches the snapshot,
+        otherwise they are rebuilt from the records.
+        """
+        book = cls()
+        for view in snapshot.ordered():
+            book.data[view.name] = Record.from_view(view)
+            book.next_position = view.position + 1
+        book.version = snapshot.version
+        book.tombstones = dict(snapshot.tombstones)
+        if indexes is not None and stamp == book.index_stamp() and len(indexes.names) == len(book.data):
+            book.indexes = indexes
+            for record in book.data.values():
+                book._attach(record)
+        else:
+            book.rebuild_indexes()
+        book._shards = list(snapshot.shards)
+        book._shared = [True] * SHARDS
+        book._published = snapshot
+        book._tombstones_changed = False
+        return book
+
+    def rebuild_indexes(self):
+        """Recomputes all indexes from the records."""
+        self._tags = None
+        for record in self.data.values():
+            self._attach(record)
+        self.indexes = BookIndexes.build(self.data.items(), self.tombstones.items())
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('indexes', 'token', '_tags', '_shards', '_shared', '_published', '_tombstones_changed',
+                     '_publish_lock'):
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+        self.rebuild_indexes()
+
+    def changes_since(self, since):
+        """
+        Returns the records changed after a time (or all of them when the
+        time is None) and the (name, time) of the contacts deleted after it,
+        oldest change first.
+        """
+        changed, deleted = [], []
+        for when, name in self.indexes.changes.since(since):
+            record = self.data.get(name)
+            if record is not None:
+                changed.append(record)
+            else:
+                deleted.append((name, when))
+        return changed, deleted
+
     def add_record(self, record):
         """Adds a new contact record to the address book."""
-        self.data[record.name.value] = record
+        self[record.name.value] = record
 
     def find_record(self, name):
         """Finds a contact record by name."""
@@ -208,28 +562,27 @@ class AddressBook(UserDict):
     def delete_record(self, name):
         """Deletes a contact record by name."""
         if name in self.data:
-            del self.data[name]
+            del self[name]
+
+    def upcoming_birthdays(self, days=7):
+        """
+        Finds contacts with birthdays within the specified number of days,
+        using the birthday index.
+        Returns a list of (date of the next birthday, record), soonest first.
+        """
+        today = datetime.now().date()
+        result = []
+        for day, names in self.indexes.birthdays_between(today, days):
+            for name in sorted(names):
+                result.append((day, self.data[name]))
+        return result
 
     def upcoming_birthday(self, days=7):
         """
         Finds contacts with upcoming birthdays within the specified number of days.
         Returns a list of records with upcoming birthdays.
         """
-        list_bday = []
-        today = datetime.now().date()
-        for record in self.data.values():
-            if record.birthday:
-                # Calculate the birthday for the current year
-                bday_this_year = record.birthday.value.replace(year=today.year)
-                if bday_this_year < today:
-                    # If the birthday has already passed this year, calculate for the next year
-                    bday_this_year = record.birthday.value.replace(
-                        year=today.year + 1)
-                # Check if the birthday is within the specified range
-                if 0 <= (bday_this_year - today).days <= days:
-                    list_bday.append(record)
-
-        return list_bday
+        return [record for _, record in self.upcoming_birthdays(days)]
 
     def rename_record(self, old_name, new_name):
         """
@@ -237,9 +590,10 @@ class AddressBook(UserDict):
         Moves the record to the new name in the address book.
         """
         if old_name in self.data:
-            record = self.data.pop(old_name)
+            record = self.data[old_name]
+            del self[old_name]
             record.edit_name(new_name)
-            self.data[new_name] = record
+            self[new_name] = record
         else:
             raise KeyError
 
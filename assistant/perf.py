@@ -0,0 +1,138 @@
+import cProfile
+import io
+import math
+import os
+import pstats
+import time
+from collections import deque
+from datetime import datetime
+
+SLOW_THRESHOLD_MS = float(os.environ.get('ASSISTANT_SLOW_MS', '500'))
+SLOW_LOG_FILE = os.environ.get('ASSISTANT_SLOW_LOG', 'slow_commands.log')
+PROFILE_FILE = 'profile.out'
+# Number of recent samples kept per command for the percentiles
+WINDOW = 1000
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of already sorted values."""
+    if not values:
+        return 0.0
+    rank = math.ceil(fraction * len(values))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class Timings:
+    """Rolling wall-clock and CPU samples of one command or function."""
+
+    def __init__(self, window=WINDOW):
+        self.wall = deque(maxlen=window)
+        self.cpu = deque(maxlen=window)
+        self.calls = 0
+        self.total_wall = 0.0
+        self.max_size = 0
+
+    def add(self, wall, cpu, size=0):
+        self.wall.append(wall)
+        self.cpu.append(cpu)
+        self.calls += 1
+        self.total_wall += wall
+        self.max_size = max(self.max_size, size)
+
+    def summary(self):
+        wall = sorted(self.wall)
+        cpu = sorted(self.cpu)
+        return {
+            'calls': self.calls,
+            'p50_ms': percentile(wall, 0.50) * 1000,
+            'p95_ms': percentile(wall, 0.95) * 1000,
+            'p99_ms': percentile(wall, 0.99) * 1000,
+            'cpu_p50_ms': percentile(cpu, 0.50) * 1000,
+            'total_ms': self.total_wall * 1000,
+            'max_size': self.max_size,
+        }
+
+
+class PerfMonitor:
+    """
+    Collects per-command latency statistics.
+    Commands slower than the threshold are appended to the slow log,
+    and the next N commands can be captured with cProfile.
+    """
+
+    def __init__(self, slow_ms=SLOW_THRESHOLD_MS, log_file=SLOW_LOG_FILE):
+        self.slow_ms = slow_ms
+        self.log_file = log_file
+        self.commands = {}
+        self.functions = {}
+        self.profiler = None
+        self.profile_remaining = 0
+
+    def start(self):
+        """Marks the beginning of a command. Returns the start timestamps."""
+        if self.profile_remaining and self.profiler is None:
+            self.profiler = cProfile.Profile()
+        if self.profiler:
+            self.profiler.enable()
+        return time.perf_counter(), time.process_time()
+
+    def finish(self, command, started, argc=0, size=0):
+        """Records a finished command and logs it if it was slow."""
+        wall = time.perf_counter() - started[0]
+        cpu = time.process_time() - started[1]
+        if self.profiler:
+            self.profiler.disable()
+            self.profile_remaining -= 1
+            if self.profile_remaining <= 0:
+                self.profiler.dump_stats(PROFILE_FILE)
+                self.profiler = None
+        self.commands.setdefault(command, Timings()).add(wall, cpu, size)
+        if wall * 1000 >= self.slow_ms:
+            self._log_slow(command, wall, cpu, argc, size)
+
+    def record_call(self, name, wall, cpu):
+        """Records the time spent inside a single core function."""
+        self.functions.setdefault(name, Timings()).add(wall, cpu)
+
+    def _log_slow(self, command, wall, cpu, argc, size):
+        try:
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(f"{datetime.now().isoformat(timespec='seconds')}\t{command}\t"
+                        f"wall={wall * 1000:.1f}ms\tcpu={cpu * 1000:.1f}ms\t"
+                        f"args={argc}\tsize={size}\n")
+        except OSError:
+            pass
+
+    def profile(self, count):
+        """Arms cProfile for the next count commands."""
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler = None
+        self.profile_remaining = count
+
+    def reset(self):
+        self.commands.clear()
+        self.functions.clear()
+
+    def stats(self):
+        return {
+            'slow_ms': self.slow_ms,
+            'slow_log': self.log_file,
+            'profiling': self.profile_remaining,
+            'commands': {name: t.summary() for name, t in sorted(self.commands.items())},
+            'functions': {name: t.summary() for name, t in sorted(self.functions.items())},
+        }
+
+
+def profile_report(limit=15):
+    """Returns the top entries of the last profile capture as text."""
+    if not os.path.exists(PROFILE_FILE):
+        return None
+    stream = io.StringIO()
+    stats = pstats.Stats(PROFILE_FILE, stream=stream)
+    stats.sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+# Shared monitor used by the dispatch loop and exception_handler
+MONITOR = PerfMonitor()
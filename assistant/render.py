@@ -0,0 +1,78 @@
+import json
+from colorama import Fore, Style
+
+# Colors used by the TTY renderer for result statuses and line styles
+STYLES = {
+    'ok': Fore.GREEN,
+    'warning': Fore.YELLOW,
+    'error': Fore.RED,
+    'header': Fore.BLUE,
+    'label': Fore.CYAN,
+}
+
+
+def format_record(record, color=True):
+    """
+    Returns a multi-line description of a contact,
+    including name, phones, birthday, email, notes, address and tags.
+    """
+    cyan = Fore.CYAN if color else ''
+    reset = Style.RESET_ALL if color else ''
+    phone_str = ', '.join(str(k)
+                          for k in record.phones) if record.phones else '📵 No phones'
+    bday_str = f'🎂 Birthday:{reset}{record.birthday}' if record.birthday else '🎂 Birthday: Not set'
+    note_str = f'📝 Note: {reset}{record.note}' if record.note else '📝 Note: Not set'
+    email_str = f'✉️  Email:{reset}{record.email.value}' if record.email else '✉️  Email: Not set'
+    address_str = f'🏠 Address: {reset}{record.address}' if record.address else '🏠 Address: Not set'
+    tags_str = f'Tags: {record.show_tags()}' if record.tags else 'Tags: Not set'
+
+    return (
+        f"{cyan}{'.' * 50}{reset}\n"
+        f"👤{cyan} Contact name:{reset} {record.name} \n"
+        f"📞{cyan} Phones:{reset} {phone_str}\n"
+        f"{cyan}{bday_str}{reset}\n"
+        f"{cyan}{email_str}{reset}\n"
+        f"{cyan}{note_str}{reset}\n"
+        f"{cyan}{address_str}{reset}\n"
+        f"{cyan}{tags_str}{reset}\n"
+        f"{cyan}{'.' * 50}{reset}\n"
+    )
+
+
+def _paint(style, text, color):
+    if color and style in STYLES:
+        return STYLES[style] + text + Style.RESET_ALL
+    return text
+
+
+def _render_text(result, color):
+    output = []
+    if result.message:
+        output.append(_paint(result.status, result.message, color))
+    for style, text in result.lines():
+        output.append(_paint(style, text, color))
+    for record in result.records:
+        output.append(format_record(record, color))
+    return '\n'.join(output)
+
+
+def render_color(result):
+    """Renders a result for an interactive terminal."""
+    return _render_text(result, color=True)
+
+
+def render_plain(result):
+    """Renders a result as text without escape sequences."""
+    return _render_text(result, color=False)
+
+
+def render_json(result):
+    """Renders a result as a single JSON line."""
+    return json.dumps(result.to_dict(), ensure_ascii=False, default=str)
+
+
+RENDERERS = {
+    'color': render_color,
+    'plain': render_plain,
+    'json': render_json,
+}
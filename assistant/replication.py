@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timezone
+from assistant.snapshot import RecordView
+from assistant.storage import load_data
+
+# The journal of a book is kept next to its snapshot, as <book>.pkl.journal.
+# Its first line names the snapshot it continues (inode, size, mtime); every
+# following line is one batch of changes written after a command:
+#   {"at": time written, "version": book version,
+#    "changed": [record views], "deleted": [[name, time deleted]]}
+# A batch holds the latest state of every contact changed since the previous
+# one, so applying the batches in order brings a copy of the snapshot up to date.
+JOURNAL_SUFFIX = '.journal'
+# Seconds between two checks of the primary's files by a follower
+FOLLOW_INTERVAL = float(os.environ.get('ASSISTANT_FOLLOW_INTERVAL', '0.5'))
+
+
+def snapshot_signature(path):
+    """Identifies one saved snapshot; saving replaces the file and changes it."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+
+def encode_view(view):
+    data = view._asdict()
+    data['phones'] = list(view.phones)
+    data['tags'] = sorted(view.tags)
+    for field in ('birthday', 'created', 'modified'):
+        if data[field] is not None:
+            data[field] = data[field].isoformat()
+    return data
+
+
+def decode_view(data):
+    data = dict(data)
+    data['phones'] = tuple(data['phones'])
+    data['tags'] = frozenset(data['tags'])
+    if data['birthday']:
+        data['birthday'] = date.fromisoformat(data['birthday'])
+    for field in ('created', 'modified'):
+        if data[field]:
+            data[field] = datetime.fromisoformat(data[field])
+    return RecordView(**data)
+
+
+def read_batches(path, signature, offset=0):
+    """
+    Reads the complete batches of a journal from an offset.
+    Returns (batches, offset after the last complete line, journal size),
+    or None when the journal is missing or continues another snapshot.
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            header = f.readline()
+            if not header.endswith(b'\n') or json.loads(header)['snapshot'] != signature:
+                return None
+            f.seek(max(offset, len(header)))
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    complete = data[:data.rfind(b'\n') + 1]
+    batches = [json.loads(line) for line in complete.splitlines()]
+    return batches, max(offset, len(header)) + len(complete), size
+
+
+def apply_batch(book, batch):
+    book.apply_changes([decode_view(view) for view in batch['changed']],
+                       [(name, datetime.fromisoformat(when)) for name, when in batch['deleted']])
+
+
+class Journal:
+    """
+    Append-only log of the changes made to a book since its snapshot was saved.
+    Followers replay it to stay current without reloading the snapshot, and a
+    book reopened after a crash recovers the changes it had not saved.
+    """
+
+    def __init__(self, book, path):
+        self.book = book
+        self.snapshot_path = path
+        self.path = path + JOURNAL_SUFFIX
+        found = read_batches(self.path, snapshot_signature(path))
+        # A journal that continues another snapshot is replaced by the first
+        # batch, so that a book which is only read writes nothing
+        self.started = found is not None
+        if found is not None:
+            for batch in found[0]:
+                apply_batch(book, batch)
+        self._mark()
+
+    def _mark(self):
+        self.cursor = self.book.indexes.changes.last()
+        self.version = self.book.version
+
+    def reset(self):
+        """Starts an empty journal for the snapshot just saved."""
+        self._start()
+        self._mark()
+
+    def _start(self):
+        header = json.dumps({'snapshot': snapshot_signature(self.snapshot_path)})
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(header + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self.started = True
+
+    def append(self):
+        """Writes the changes made since the last batch as one line, if there are any."""
+        if self.book.version == self.version:
+            return
+        if not self.started:
+            self._start()
+        changed, deleted = self.book.changes_since(self.cursor)
+        batch = {
+            'at': time.time(),
+            'version': self.book.version,
+            'changed': [encode_view(record.freeze()) for record in changed],
+            'deleted': [[name, when.isoformat()] for name, when in deleted],
+        }
+        with open(self.path, 'ab') as f:
+            f.write(json.dumps(batch, ensure_ascii=False).encode('utf-8') + b'\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._mark()
+
+
+class Follower:
+    """
+    Read-only copy of a book saved by another process.
+    A background thread checks the primary's files every interval. The
+    snapshot is loaded once per generation, that is once per save of the
+    primary; in between, new journal batches are read from the last offset and
+    applied to the loaded book. Commands hold the lock, so that no batch is
+    applied while they run. Exposes the parts of Workspace that the read-only
+    commands use.
+    """
+
+    def __init__(self, path, interval=FOLLOW_INTERVAL):
+        self.snapshot_path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.current_name = os.path.splitext(os.path.basename(path))[0]
+        self.books = {}
+        self.signature = None
+        self.offset = 0
+        self.journal_size = 0
+        self.batches = 0
+        self.reloads = 0
+        self.primary_version = None
+        self.last_batch_at = None
+        self.lag = None
+        self.polled_at = None
+        self.error = None
+        self.lock = threading.Lock()
+        self.poll()
+        self.interval = interval
+        threading.Thread(target=self._follow, daemon=True).start()
+
+    @property
+    def current(self):
+        return self.books[self.current_name]
+
+    def path(self, name):
+        return self.snapshot_path
+
+    def get(self, name):
+        return self.current
+
+    def available(self):
+        return [self.current_name]
+
+    def publish(self):
+        """Followers never write the book or its journal."""
+
+    def save_all(self):
+        """Followers never write the book or its journal."""
+
+    def _follow(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                try:
+                    self.poll()
+                    self.error = None
+                except Exception as e:
+                    # Tried again at the next interval
+                    self.error = f'{e}'
+
+    def poll(self):
+        """Catches up with the primary: reloads a new snapshot, then applies new batches."""
+        signature = snapshot_signature(self.snapshot_path)
+        if not self.books or signature != self.signature:
+            self._reload()
+        found = read_batches(self.journal_path, self.signature, self.offset)
+        if found is not None:
+            batches, self.offset, self.journal_size = found
+            for batch in batches:
+                apply_batch(self.current, batch)
+                self.batches += 1
+                self.primary_version = batch['version']
+                self.last_batch_at = batch['at']
+                self.lag = time.time() - batch['at']
+        self.polled_at = time.time()
+
+    def _reload(self):
+        while True:
+            signature = snapshot_signature(self.snapshot_path)
+            book = load_data(self.snapshot_path)
+            # Retry if the primary saved again while the snapshot was read
+            if snapshot_signature(self.snapshot_path) == signature:
+                break
+        book.read_only = True
+        self.books = {self.current_name: book}
+        self.signature = signature
+        self.offset = 0
+        self.reloads += 1
+        self.primary_version = book.version
+
+    def status(self):
+        """Reports how far the copy is behind the primary."""
+        try:
+            journal_size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            journal_size = 0
+        behind = max(journal_size - self.offset, 0) if journal_size >= self.journal_size else None
+        return {
+            'primary': self.snapshot_path,
+            'snapshot_reloads': self.reloads,
+            'journal_offset': self.offset,
+            'journal_bytes': journal_size,
+            'behind_bytes': behind,
+            'batches_applied': self.batches,
+            'primary_version': self.primary_version,
+            'last_batch_at': (datetime.fromtimestamp(self.last_batch_at, timezone.utc).isoformat()
+                              if self.last_batch_at else None),
+            'lag_seconds': round(self.lag, 3) if self.lag is not None else None,
+            'seconds_since_poll': round(time.time() - self.polled_at, 3),
+            'poll_error': self.error,
+        }
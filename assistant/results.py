@@ -0,0 +1,64 @@
+OK = 'ok'
+INFO = 'info'
+WARNING = 'warning'
+ERROR = 'error'
+
+# Error codes carried by failed results
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+MISSING_ARGUMENTS = 'missing_arguments'
+UNKNOWN_COMMAND = 'unknown_command'
+FAILED = 'failed'
+READ_ONLY = 'read_only'
+
+
+class Result:
+    """
+    Outcome of a command, free of any presentation.
+    Holds a status, an optional error code, a short message,
+    the records the command produced and any structured data.
+    A formatter turns the data into (style, text) lines for text renderers;
+    it is never called when the result is rendered as JSON.
+    """
+
+    def __init__(self, status=OK, message='', records=None, data=None, code=None, formatter=None):
+        self.status = status
+        self.message = message
+        self.records = records or []
+        self.data = data
+        self.code = code
+        self.formatter = formatter
+
+    @property
+    def ok(self):
+        return self.status != ERROR
+
+    def lines(self):
+        """Returns the (style, text) lines describing the data."""
+        return list(self.formatter(self.data)) if self.formatter else []
+
+    def to_dict(self):
+        result = {'status': self.status, 'message': self.message}
+        if self.code:
+            result['code'] = self.code
+        if self.records:
+            result['records'] = [record.to_dict() for record in self.records]
+        if self.data is not None:
+            result['data'] = self.data
+        return result
+
+
+def ok(message='', **kwargs):
+    return Result(OK, message, **kwargs)
+
+
+def info(message='', **kwargs):
+    return Result(INFO, message, **kwargs)
+
+
+def warning(message='', **kwargs):
+    return Result(WARNING, message, **kwargs)
+
+
+def error(code, message, **kwargs):
+    return Result(ERROR, message, code=code, **kwargs)
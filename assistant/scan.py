@@ -0,0 +1,189 @@
+import atexit
+import multiprocessing
+import os
+
+# Books smaller than this are scanned in-process; forking does not pay off for them
+PARALLEL_THRESHOLD = int(os.environ.get('ASSISTANT_PARALLEL_MIN', '50000'))
+WORKERS = int(os.environ.get('ASSISTANT_SCAN_WORKERS', str(os.cpu_count() or 1)))
+# Chunks per worker, so that uneven chunks still keep every core busy
+CHUNKS_PER_WORKER = 4
+
+# Searchable text of every record, by slot, shared with the worker pool.
+# Workers inherit it copy-on-write when they are forked instead of receiving
+# a pickled book per query. It stays set while the pool lives, so that a
+# worker the pool starts again still finds it.
+_CORPUS = {}
+
+
+def contact_text(view):
+    """Text matched by search: name, phones, email and note of a record view."""
+    return '\0'.join([view.name, *view.phones, view.email or '', view.note]).lower()
+
+
+def note_text(view):
+    """Text matched by note search: the note and the tags of a record view."""
+    return f"{view.note}\0{' '.join(sorted(view.tags))}".lower()
+
+
+FIELDS = {
+    'contacts': contact_text,
+    'notes': note_text,
+}
+
+
+def _match(texts, query, start, end):
+    return [i for i, text in enumerate(texts[start:end], start) if query in text]
+
+
+def _scan_chunk(task):
+    field, query, start, end = task
+    return _match(_CORPUS[field], query, start, end)
+
+
+class Scanner:
+    """
+    Substring scan over the records of a book, read from a snapshot.
+    For large books the searchable text is kept by slot and patched when the
+    book changes: only the shards a snapshot does not share with the previous
+    one are compared, and only the records changed in them are prepared again.
+    With more than one worker the text is split into chunks matched by a pool
+    of forked processes. Slots changed or added after the pool was forked are
+    matched in-process instead, and the pool is forked again once they outgrow
+    a chunk. Results keep the order of the book.
+    """
+
+    def __init__(self, workers=WORKERS, threshold=PARALLEL_THRESHOLD):
+        self.workers = workers
+        self.threshold = threshold
+        self.pool = None
+        self.close()
+
+    @property
+    def can_fork(self):
+        return self.workers > 1 and 'fork' in multiprocessing.get_all_start_methods()
+
+    def search(self, book, query, field='contacts'):
+        """Returns the records whose text for the field contains the query."""
+        query = query.lower()
+        snapshot = book.snapshot()
+        if len(snapshot) < self.threshold:
+            text = FIELDS[field]
+            names = [view.name for view in snapshot.ordered() if query in text(view)]
+        else:
+            self._prepare(book, snapshot)
+            names = [self.names[i] for i in self._matches(query, field)]
+        # Contacts deleted since the snapshot was taken are left out
+        records = (book.data.get(name) for name in names)
+        return [record for record in records if record is not None]
+
+    def _matches(self, query, field):
+        texts = self.texts[field]
+        if self.pool is None:
+            matches, extra = _match(texts, query, 0, len(texts)), False
+        else:
+            step = self._chunk()
+            tasks = [(field, query, start, min(start + step, self.base))
+                     for start in range(0, self.base, step)]
+            matches = []
+            for chunk in self.pool.map(_scan_chunk, tasks):
+                matches.extend(i for i in chunk if i not in self.dirty)
+            # The workers hold the text as it was when they were forked
+            fresh = [*sorted(self.dirty), *range(self.base, len(texts))]
+            extra = [i for i in fresh if query in texts[i]]
+            matches.extend(extra)
+        matches = [i for i in matches if self.names[i] is not None]
+        if extra or not self.ordered:
+            matches.sort(key=self.positions.__getitem__)
+        return matches
+
+    def _chunk(self):
+        return max(1, -(-self.base // (self.workers * CHUNKS_PER_WORKER)))
+
+    def _prepare(self, book, snapshot):
+        key = (book.token, snapshot.version)
+        if key == self.key:
+            return
+        if self.key is None or self.key[0] != book.token or self.dead > len(self.names) // 2:
+            self._build(snapshot)
+        else:
+            self._patch(self.snapshot, snapshot)
+        self.key = key
+        self.snapshot = snapshot
+        stale = len(self.dirty) + len(self.names) - self.base
+        if self.can_fork and (self.pool is None or stale > self._chunk()):
+            self._fork()
+
+    def _build(self, snapshot):
+        self.close()
+        views = snapshot.ordered()
+        self.names = [view.name for view in views]
+        self.positions = [view.position for view in views]
+        self.slots = {name: slot for slot, name in enumerate(self.names)}
+        self.texts = {field: [text(view) for view in views] for field, text in FIELDS.items()}
+        _CORPUS.update(self.texts)
+
+    def _patch(self, previous, snapshot):
+        """Updates the slots of the records that changed between two snapshots."""
+        for old, new in zip(previous.shards, snapshot.shards):
+            if new is old:
+                continue
+            for name in old.keys() - new.keys():
+                self._remove(name)
+            for name, view in new.items():
+                if old.get(name) is not view:
+                    self._put(view)
+
+    def _put(self, view):
+        slot = self.slots.get(view.name)
+        if slot is None:
+            slot = self.slots[view.name] = len(self.names)
+            if self.positions and view.position < self.positions[-1]:
+                self.ordered = False
+            self.names.append(view.name)
+            self.positions.append(view.position)
+            for field, text in FIELDS.items():
+                self.texts[field].append(text(view))
+            return
+        if view.position != self.positions[slot]:
+            self.positions[slot] = view.position
+            self.ordered = False
+        for field, text in FIELDS.items():
+            self.texts[field][slot] = text(view)
+        if slot < self.base:
+            self.dirty.add(slot)
+
+    def _remove(self, name):
+        slot = self.slots.pop(name)
+        self.names[slot] = None
+        for texts in self.texts.values():
+            texts[slot] = ''
+        self.dead += 1
+        if slot < self.base:
+            self.dirty.add(slot)
+
+    def _fork(self):
+        if self.pool is not None:
+            self.pool.terminate()
+        self.pool = multiprocessing.get_context('fork').Pool(self.workers)
+        self.base = len(self.names)
+        self.dirty = set()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+        _CORPUS.clear()
+        self.key = None
+        self.snapshot = None
+        self.names = []
+        self.positions = []
+        self.slots = {}
+        self.texts = {field: [] for field in FIELDS}
+        self.ordered = True
+        self.dead = 0
+        self.base = 0
+        self.dirty = set()
+
+
+SCANNER = Scanner()
+atexit.register(SCANNER.close)
@@ -0,0 +1,61 @@
+import zlib
+from collections import namedtuple
+from collections.abc import Mapping
+
+# Records are spread over this many shards. A write copies only the shard it
+# touches, and only if a published snapshot still shares it.
+SHARDS = 256
+
+# Immutable copy of a record as it was when the snapshot was published
+RecordView = namedtuple('RecordView', [
+    'name', 'phones', 'birthday', 'email', 'note', 'tags', 'address', 'position',
+    'created', 'modified',
+], defaults=(None, None))
+
+
+def shard_of(name):
+    """Returns the shard a contact name belongs to."""
+    return zlib.crc32(name.encode('utf-8')) % SHARDS
+
+
+class BookSnapshot(Mapping):
+    """
+    Read-only, point-in-time view of an address book, mapping names to RecordView.
+    Snapshots share their shards with the book and with each other; the book
+    copies a shard before changing it, so a snapshot never changes after it
+    has been published and can be read from any thread without locking.
+    """
+
+    def __init__(self, shards, version, count, tombstones=None):
+        self.shards = shards
+        self.version = version
+        self.count = count
+        # Names of the deleted contacts and when they were deleted
+        self.tombstones = tombstones or {}
+
+    def __getitem__(self, name):
+        return self.shards[shard_of(name)][name]
+
+    def __contains__(self, name):
+        return name in self.shards[shard_of(name)]
+
+    def __iter__(self):
+        for shard in self.shards:
+            yield from shard
+
+    def __len__(self):
+        return self.count
+
+    def views(self):
+        """Yields the record views in no particular order."""
+        for shard in self.shards:
+            yield from shard.values()
+
+    def ordered(self):
+        """Returns the record views in the order they were added to the book."""
+        views = list(self.views())
+        views.sort(key=lambda view: view.position)
+        return views
+
+    def __reduce__(self):
+        return BookSnapshot, (self.shards, self.version, self.count, self.tombstones)
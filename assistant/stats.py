@@ -0,0 +1,164 @@
+import os
+import pickle
+import sys
+import tracemalloc
+from collections import Counter
+from itertools import islice
+from assistant.models import AddressBook
+from assistant.storage import LAST_IO
+
+# Number of most used tags listed in the report
+TOP_TAGS = 10
+
+
+def deep_sizeof(obj, seen):
+    """
+    Returns the size in bytes of an object and everything it references.
+    Objects already in seen are skipped, so shared objects are counted once.
+    """
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if current is None or id(current) in seen:
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        elif hasattr(current, '__dict__'):
+            stack.append(current.__dict__)
+    return size
+
+
+def estimate_size(book, sample=256):
+    """
+    Estimates the memory used by a book from a sample of its records,
+    so that it stays cheap on large books. The sample is taken from a snapshot.
+    """
+    snapshot = book.snapshot()
+    seen = set()
+    sampled = 0
+    size = 0
+    for view in islice(snapshot.views(), sample):
+        record = book.data.get(view.name)
+        if record is None:
+            continue
+        size += sys.getsizeof(record.__dict__) + sys.getsizeof(record)
+        for name, value in record.__dict__.items():
+            if name != '_book':
+                size += deep_sizeof(value, seen)
+        sampled += 1
+    if not sampled:
+        return sys.getsizeof(book.data)
+    return sys.getsizeof(book.data) + size * len(snapshot) // sampled
+
+
+def traced_size(book):
+    """
+    Measures with tracemalloc how much memory a copy of the book allocates,
+    built from its snapshot as loading does.
+    The copy is released right away, but peak memory briefly doubles.
+    """
+    payload = pickle.dumps(book.snapshot(), protocol=pickle.HIGHEST_PROTOCOL)
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    copy = AddressBook.from_snapshot(pickle.loads(payload))
+    size = tracemalloc.get_traced_memory()[0] - before
+    del copy
+    if not was_tracing:
+        tracemalloc.stop()
+    return size
+
+
+def index_memory(book, snapshot, seen):
+    """
+    Returns the approximate memory of the structures kept beside the records:
+    the secondary indexes, the change log, the snapshot shards and, once built,
+    the tag matrix. Objects in seen, such as names shared with the records,
+    are not counted again.
+    """
+    indexes = book.indexes
+    memory = {
+        'name_index': deep_sizeof(indexes.names, seen),
+        'tag_index': deep_sizeof(indexes.tags, seen),
+        'birthday_index': deep_sizeof(indexes.birthdays, seen),
+        'address_index': deep_sizeof(indexes.addresses, seen),
+        'change_log': deep_sizeof(indexes.changes, seen),
+        'snapshot': deep_sizeof(snapshot.shards, seen) + deep_sizeof(snapshot.tombstones, seen),
+        'tag_matrix': 0,
+    }
+    if book._tags is not None:
+        memory['tag_matrix'] = deep_sizeof(book._tags, seen)
+    return memory
+
+
+def book_stats(book, filename=None, trace=False):
+    """
+    Collects the size of the book: counts, distributions, approximate
+    memory per structure, snapshot size and last load/save durations.
+    Counts come from a snapshot.
+    """
+    snapshot = book.snapshot()
+    tag_counts = Counter()
+    phones_per_record = Counter()
+    tags_per_record = Counter()
+    counts = {'contacts': len(snapshot), 'phones': 0, 'emails': 0, 'birthdays': 0,
+              'addresses': 0, 'notes': 0, 'note_bytes': 0, 'tag_assignments': 0}
+    seen = set()
+    memory = {'book': sys.getsizeof(book) + sys.getsizeof(book.data), 'records': 0,
+              'names': 0, 'phones': 0, 'emails': 0, 'birthdays': 0, 'notes': 0,
+              'addresses': 0, 'tags': 0}
+
+    for view in snapshot.views():
+        phones_per_record[len(view.phones)] += 1
+        tags_per_record[len(view.tags)] += 1
+        tag_counts.update(view.tags)
+        counts['phones'] += len(view.phones)
+        counts['tag_assignments'] += len(view.tags)
+        counts['emails'] += view.email is not None
+        counts['birthdays'] += view.birthday is not None
+        counts['addresses'] += bool(view.address)
+        if view.note:
+            counts['notes'] += 1
+            counts['note_bytes'] += len(view.note.encode('utf-8'))
+
+        # Memory is measured on the live record, if it still exists
+        record = book.data.get(view.name)
+        if record is None:
+            continue
+        memory['records'] += sys.getsizeof(record) + sys.getsizeof(record.__dict__)
+        memory['names'] += deep_sizeof(record.name, seen)
+        memory['phones'] += deep_sizeof(record.phones, seen)
+        memory['emails'] += deep_sizeof(record.email, seen)
+        memory['birthdays'] += deep_sizeof(record.birthday, seen)
+        memory['notes'] += deep_sizeof(record.note, seen)
+        memory['addresses'] += deep_sizeof(record.address, seen)
+        memory['tags'] += deep_sizeof(record.tags, seen)
+    counts['tags'] = len(tag_counts)
+    memory.update(index_memory(book, snapshot, seen))
+    memory['total'] = sum(memory.values())
+    if trace:
+        memory['traced'] = traced_size(book)
+
+    disk = None
+    if filename and os.path.exists(filename):
+        disk = os.path.getsize(filename)
+
+    return {
+        'counts': counts,
+        'distribution': {
+            'phones_per_contact': dict(sorted(phones_per_record.items())),
+            'tags_per_contact': dict(sorted(tags_per_record.items())),
+            'top_tags': dict(tag_counts.most_common(TOP_TAGS)),
+        },
+        'memory_bytes': memory,
+        'disk_bytes': disk,
+        'last_load_seconds': LAST_IO['load'],
+        'last_save_seconds': LAST_IO['save'],
+    }
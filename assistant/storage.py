@@ -1,15 +1,283 @@
+import io
+import lzma
+import os
 import pickle
+import struct
+import time
+import zlib
+from assistant.changes import advance_clock
 from assistant.models import AddressBook
+from assistant.snapshot import BookSnapshot
 
+# Snapshot container layout:
+#   header: magic, schema version, codec id
+#   blocks: raw length, stored length, crc32 of the stored bytes, stored bytes
+#   end:    a block header with zero lengths
+# The payload is a pickled dict with the book snapshot (with modification
+# times and tombstones since version 4) and the indexes, followed by a second
+# pickle with the stamp of the indexes, taken once they are written
+# (version 4: the indexes pickled separately and the stamp in the dict,
+# version 2: the snapshot alone, version 1: the AddressBook),
+# split into blocks before compression so that neither saving nor loading
+# needs the whole stream in memory at once.
+MAGIC = b'CLIBOOK\n'
+SCHEMA_VERSION = 5
+HEADER = struct.Struct('>8sHB')
+BLOCK_HEADER = struct.Struct('>III')
+BLOCK_SIZE = 1 << 20
 
-def save_data(book, filename='addressbook.pkl'):
-    with open(filename, 'wb') as f:
-        pickle.dump(book, f)
+# Codecs trade speed for size: 'none' is fastest, 'lzma' is smallest,
+# 'zlib' sits in between and is the default.
+CODECS = {
+    'none': (0, lambda data: data, lambda data: data),
+    'zlib': (1, zlib.compress, zlib.decompress),
+    'lzma': (2, lzma.compress, lzma.decompress),
+}
+CODEC_NAMES = {codec_id: name for name, (codec_id, _, _) in CODECS.items()}
+DEFAULT_CODEC = os.environ.get('ASSISTANT_SNAPSHOT_CODEC', 'zlib')
+
+# Duration in seconds of the last load and save, reported by the stats command
+LAST_IO = {'load': None, 'save': None}
+
+# Only the classes an address book is made of may be unpickled.
+SAFE_CLASSES = {
+    'assistant.models': {'AddressBook', 'Record', 'Field', 'Name', 'Phone', 'Birthday', 'Email'},
+    'assistant.snapshot': {'BookSnapshot', 'RecordView'},
+    'assistant.indexes': {'BookIndexes', 'SortedNames'},
+    'assistant.changes': {'ChangeLog'},
+    'assistant.address': {'AddressIndex'},
+    'datetime': {'date', 'datetime', 'timedelta', 'timezone'},
+    'builtins': {'set', 'frozenset'},
+    'copyreg': {'_reconstructor'},
+}
+
+
+class SnapshotError(ValueError):
+    """Raised when a stored address book is corrupted or unsupported."""
+
+
+class SafeUnpickler(pickle.Unpickler):
+    """Unpickler that refuses to load anything but address book classes."""
+
+    def find_class(self, module, name):
+        if name in SAFE_CLASSES.get(module, ()):
+            return super().find_class(module, name)
+        raise SnapshotError(f'Forbidden class in address book file: {module}.{name}')
+
+
+class BlockWriter(io.RawIOBase):
+    """Writable stream that cuts the data into compressed, checksummed blocks."""
+
+    def __init__(self, f, codec):
+        self.f = f
+        self.compress = CODECS[codec][1]
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= BLOCK_SIZE:
+            self._write_block(bytes(self.buffer[:BLOCK_SIZE]))
+            del self.buffer[:BLOCK_SIZE]
+        return len(data)
+
+    def _write_block(self, raw):
+        stored = self.compress(raw)
+        self.f.write(BLOCK_HEADER.pack(len(raw), len(stored), zlib.crc32(stored)))
+        self.f.write(stored)
+
+    def close(self):
+        if not self.closed:
+            if self.buffer:
+                self._write_block(bytes(self.buffer))
+                self.buffer.clear()
+            self.f.write(BLOCK_HEADER.pack(0, 0, 0))
+        super().close()
+
+
+def read_header(f):
+    """Reads and validates the snapshot header. Returns (version, codec name)."""
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size or not header.startswith(MAGIC):
+        raise SnapshotError('Not an address book snapshot')
+    _, version, codec_id = HEADER.unpack(header)
+    if version > SCHEMA_VERSION:
+        raise SnapshotError(f'Unsupported snapshot version {version}')
+    if codec_id not in CODEC_NAMES:
+        raise SnapshotError(f'Unknown snapshot codec {codec_id}')
+    return version, CODEC_NAMES[codec_id]
+
+
+def iter_blocks(f):
+    """
+    Yields (raw length, stored bytes) for every block after the header.
+    Checks each block against its checksum and raises on truncation.
+    """
+    number = 0
+    while True:
+        header = f.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            raise SnapshotError(f'Snapshot is truncated at block {number}')
+        raw_len, stored_len, crc = BLOCK_HEADER.unpack(header)
+        if stored_len == 0:
+            return
+        stored = f.read(stored_len)
+        if len(stored) < stored_len:
+            raise SnapshotError(f'Snapshot is truncated at block {number}')
+        if zlib.crc32(stored) != crc:
+            raise SnapshotError(f'Checksum mismatch in block {number}')
+        yield raw_len, stored
+        number += 1
+
+
+class BlockReader(io.RawIOBase):
+    """Readable stream that decompresses one block at a time."""
+
+    def __init__(self, f, codec):
+        self.blocks = iter_blocks(f)
+        self.decompress = CODECS[codec][2]
+        self.current = b''
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self.pos >= len(self.current):
+            block = next(self.blocks, None)
+            if block is None:
+                return 0
+            raw_len, stored = block
+            self.current = self.decompress(stored)
+            self.pos = 0
+            if len(self.current) != raw_len:
+                raise SnapshotError('Block length mismatch')
+        size = min(len(buffer), len(self.current) - self.pos)
+        buffer[:size] = self.current[self.pos:self.pos + size]
+        self.pos += size
+        return size
+
+    def drain(self):
+        """Consumes the remaining blocks so that their checksums are verified."""
+        for _ in self.blocks:
+            pass
+
+
+def snapshot_payload(book):
+    """Returns what is saved for a book: its snapshot and its indexes."""
+    return {'snapshot': book.snapshot(), 'indexes': book.indexes}
+
+
+def index_stamp(book, payload):
+    """
+    Returns the stamp of the indexes just written with the payload.
+    If the book changed since its snapshot was taken, the indexes may not
+    match the snapshot; the stamp is None then and they are rebuilt on load.
+    """
+    if not isinstance(book, AddressBook) or payload['indexes'] is None:
+        return None
+    if book.version != payload['snapshot'].version:
+        return None
+    return book.index_stamp()
+
+
+def write_snapshot(f, book, payload, codec):
+    f.write(HEADER.pack(MAGIC, SCHEMA_VERSION, CODECS[codec][0]))
+    writer = BlockWriter(f, codec)
+    pickle.dump(payload, writer, protocol=pickle.HIGHEST_PROTOCOL)
+    pickle.dump(index_stamp(book, payload), writer, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.close()
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def save_data(book, filename='addressbook.pkl', codec=None):
+    """
+    Saves the book as a snapshot.
+    The records are serialized from the immutable snapshot taken at the
+    start, so the book can keep changing while the save runs; indexes that
+    changed meanwhile are saved without a stamp and rebuilt on load.
+    The file is written next to the target and moved into place,
+    so an interrupted save never leaves a half-written book behind.
+    """
+    codec = codec or DEFAULT_CODEC
+    payload = snapshot_payload(book) if isinstance(book, AddressBook) else book
+    if codec not in CODECS:
+        raise ValueError(f'Unknown codec {codec}, use one of: {", ".join(CODECS)}')
+    tmp_filename = filename + '.tmp'
+    started = time.perf_counter()
+    try:
+        try:
+            with open(tmp_filename, 'wb') as f:
+                write_snapshot(f, book, payload, codec)
+        except RuntimeError:
+            # The indexes changed size while they were pickled; they are rebuilt on load
+            payload['indexes'] = None
+            with open(tmp_filename, 'wb') as f:
+                write_snapshot(f, book, payload, codec)
+        os.replace(tmp_filename, filename)
+        LAST_IO['save'] = time.perf_counter() - started
+    except BaseException:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
 
 
 def load_data(filename='addressbook.pkl'):
+    started = time.perf_counter()
+    stamp = None
     try:
         with open(filename, 'rb') as f:
-            return pickle.load(f)
+            if f.read(len(MAGIC)) != MAGIC:
+                # Books saved before the snapshot format are plain pickles
+                f.seek(0)
+                book = SafeUnpickler(f).load()
+            else:
+                f.seek(0)
+                version, codec = read_header(f)
+                reader = BlockReader(f, codec)
+                unpickler = SafeUnpickler(io.BufferedReader(reader, BLOCK_SIZE))
+                book = unpickler.load()
+                if version >= 5:
+                    stamp = unpickler.load()
+                reader.drain()
     except FileNotFoundError:
-        return AddressBook()
+        book = AddressBook()
+    if isinstance(book, dict):
+        indexes = book.get('indexes')
+        if isinstance(indexes, bytes):
+            # Version 4 pickled the indexes separately
+            indexes = SafeUnpickler(io.BytesIO(indexes)).load()
+        stamp = book.get('index_stamp', stamp)
+        book = AddressBook.from_snapshot(book['snapshot'], indexes, stamp)
+    elif isinstance(book, BookSnapshot):
+        book = AddressBook.from_snapshot(book)
+    advance_clock(book.indexes.changes.last())
+    LAST_IO['load'] = time.perf_counter() - started
+    return book
+
+
+def verify_data(filename='addressbook.pkl'):
+    """
+    Checks the integrity of a snapshot without deserializing the book.
+    Only block checksums are computed, nothing is decompressed.
+    Returns a summary of the snapshot, raises SnapshotError if it is damaged.
+    """
+    with open(filename, 'rb') as f:
+        version, codec = read_header(f)
+        blocks = raw_bytes = 0
+        for raw_len, _ in iter_blocks(f):
+            blocks += 1
+            raw_bytes += raw_len
+        stored_bytes = f.tell()
+        if f.read(1):
+            raise SnapshotError('Unexpected data after the end of the snapshot')
+    return {
+        'version': version,
+        'codec': codec,
+        'blocks': blocks,
+        'raw_bytes': raw_bytes,
+        'stored_bytes': stored_bytes,
+    }
@@ -0,0 +1,198 @@
+try:
+    import numpy as np
+except ImportError:  # Tag analytics are unavailable without NumPy
+    np = None
+
+# Tags seen on fewer contacts than this are not suggested
+MIN_SUPPORT = 2
+# Share of the contacts tagged X that must also be tagged Y to suggest Y
+MIN_CONFIDENCE = 0.5
+# Largest co-occurrence matrix, one bit per tag in a 64-bit mask
+MAX_MATRIX_TAGS = 64
+
+
+def available():
+    return np is not None
+
+
+class TagAnalytics:
+    """
+    Tag frequencies and co-occurrence over a sparse contact x tag incidence matrix.
+    The matrix is kept as coordinate arrays (row per contact, column per tag):
+    added tags are appended, removed ones are queued and dropped in one
+    vectorized pass before the next query, so changes cost O(1) and queries
+    are NumPy operations over the assigned tags only.
+    """
+
+    def __init__(self, capacity=1024):
+        self.tag_ids = {}
+        self.tags = []
+        self.row_ids = {}
+        self.next_row = 0
+        self.rows = np.empty(capacity, dtype=np.int64)
+        self.cols = np.empty(capacity, dtype=np.int64)
+        self.size = 0
+        self.live = 0
+        self.frequency = np.zeros(16, dtype=np.int64)
+        # (row, column, number of entries when removed) waiting to be dropped
+        self.removed = []
+
+    @classmethod
+    def from_book(cls, book):
+        """Builds the matrix from the tag index in one pass."""
+        analytics = cls()
+        rows, cols = [], []
+        row_ids = analytics.row_ids
+        for tag, names in book.indexes.tags.items():
+            col = analytics._tag_id(tag)
+            for name in names:
+                row = row_ids.get(name)
+                if row is None:
+                    row = row_ids[name] = len(row_ids)
+                rows.append(row)
+                cols.append(col)
+        analytics.next_row = len(row_ids)
+        analytics.rows = np.array(rows + [0] * 1024, dtype=np.int64)
+        analytics.cols = np.array(cols + [0] * 1024, dtype=np.int64)
+        analytics.size = analytics.live = len(rows)
+        analytics.frequency[:len(analytics.tags)] = [len(names) for names in book.indexes.tags.values()]
+        return analytics
+
+    def _tag_id(self, tag):
+        tag_id = self.tag_ids.get(tag)
+        if tag_id is None:
+            tag_id = self.tag_ids[tag] = len(self.tags)
+            self.tags.append(tag)
+            if tag_id >= len(self.frequency):
+                self.frequency = np.concatenate([self.frequency, np.zeros_like(self.frequency)])
+        return tag_id
+
+    def _append(self, row, col):
+        if self.size == len(self.rows):
+            self.rows = np.concatenate([self.rows, np.empty_like(self.rows)])
+            self.cols = np.concatenate([self.cols, np.empty_like(self.cols)])
+        self.rows[self.size] = row
+        self.cols[self.size] = col
+        self.size += 1
+        self.live += 1
+        self.frequency[col] += 1
+
+    def add(self, name, tags):
+        """Adds a contact with its tags."""
+        if not tags:
+            return
+        row = self.row_ids[name] = self.next_row
+        self.next_row += 1
+        for tag in tags:
+            self._append(row, self._tag_id(tag))
+
+    def remove(self, name, tags):
+        """Removes a contact with its tags."""
+        row = self.row_ids.pop(name, None)
+        if row is not None:
+            self._discard(row, tags)
+
+    def update(self, name, tags, old):
+        """Applies a change of the tags of a contact."""
+        if name not in self.row_ids:
+            self.add(name, tags - old)
+            return
+        row = self.row_ids[name]
+        self._discard(row, old - tags)
+        for tag in tags - old:
+            self._append(row, self._tag_id(tag))
+
+    def _discard(self, row, tags):
+        for tag in tags:
+            col = self.tag_ids[tag]
+            self.removed.append((row, col, self.size))
+            self.live -= 1
+            self.frequency[col] -= 1
+
+    def _flush(self):
+        """Drops the queued removals and compacts the arrays."""
+        if not self.removed:
+            return
+        removed = np.array(self.removed, dtype=np.int64)
+        self.removed = []
+        width = len(self.frequency)
+        keys = removed[:, 0] * width + removed[:, 1]
+        # An entry is dead if the same pair was removed after it was added
+        order = np.lexsort((removed[:, 2], keys))
+        keys, cutoffs = keys[order], removed[order, 2]
+        last = np.append(keys[1:] != keys[:-1], True)
+        keys, cutoffs = keys[last], cutoffs[last]
+
+        entry_keys = self.rows[:self.size] * width + self.cols[:self.size]
+        found = np.minimum(np.searchsorted(keys, entry_keys), len(keys) - 1)
+        dead = (keys[found] == entry_keys) & (np.arange(self.size) < cutoffs[found])
+        keep = ~dead
+        self.size = int(keep.sum())
+        self.rows[:self.size] = self.rows[:len(keep)][keep]
+        self.cols[:self.size] = self.cols[:len(keep)][keep]
+
+    def frequencies(self, top=None):
+        """Returns (tag, contacts) pairs, most used first; all of them when top is None."""
+        counts = self.frequency[:len(self.tags)]
+        order = np.argsort(-counts, kind='stable')
+        order = order[counts[order] > 0]
+        if top is not None:
+            order = order[:max(top, 0)]
+        return [(self.tags[i], int(counts[i])) for i in order]
+
+    def co_occurrence(self, tag):
+        """Returns how many contacts tagged with tag have each other tag, by tag id."""
+        self._flush()
+        col = self.tag_ids[tag]
+        rows, cols = self.rows[:self.size], self.cols[:self.size]
+        tagged = np.zeros(self.next_row, dtype=bool)
+        tagged[rows[cols == col]] = True
+        counts = np.bincount(cols[tagged[rows]], minlength=len(self.tags))
+        counts[col] = 0
+        return counts
+
+    def related(self, tag, top=5, min_support=MIN_SUPPORT, min_confidence=0.0):
+        """
+        Returns (tag, contacts with both, share of contacts tagged with tag)
+        for the tags that most often appear together with tag.
+        """
+        if tag not in self.tag_ids or not self.frequency[self.tag_ids[tag]]:
+            return []
+        counts = self.co_occurrence(tag)
+        confidence = counts / self.frequency[self.tag_ids[tag]]
+        candidates = np.flatnonzero((counts >= min_support) & (confidence >= min_confidence))
+        order = candidates[np.lexsort((candidates, -counts[candidates]))][:top]
+        return [(self.tags[i], int(counts[i]), round(float(confidence[i]), 3)) for i in order]
+
+    def suggest(self, tags, exclude=()):
+        """Returns the tags usually found together with the given ones, as related() does."""
+        suggestions = {}
+        for tag in tags:
+            for other, both, confidence in self.related(tag, min_confidence=MIN_CONFIDENCE):
+                if other not in exclude and confidence > suggestions.get(other, (None, 0))[1]:
+                    suggestions[other] = (tag, confidence)
+        return sorted(((other, tag, confidence) for other, (tag, confidence) in suggestions.items()),
+                      key=lambda item: (-item[2], item[0]))
+
+    def matrix(self, top=10):
+        """
+        Returns the most used tags and their co-occurrence matrix as nested lists.
+        Each contact's tags among them are packed into a bit mask; contacts with
+        the same mask are counted once and the matrix is a product of the
+        distinct masks, weighted by how many contacts share them.
+        """
+        self._flush()
+        tags = [tag for tag, _ in self.frequencies(max(1, min(top, MAX_MATRIX_TAGS)))]
+        if not tags:
+            return [], []
+        position = np.full(len(self.tags), -1, dtype=np.int64)
+        position[[self.tag_ids[tag] for tag in tags]] = np.arange(len(tags))
+        rows, cols = self.rows[:self.size], position[self.cols[:self.size]]
+        selected = cols >= 0
+        rows, cols = rows[selected], cols[selected]
+
+        masks = np.zeros(self.next_row, dtype=np.uint64)
+        np.bitwise_or.at(masks, rows, np.left_shift(np.uint64(1), cols.astype(np.uint64)))
+        masks, weights = np.unique(masks[masks != 0], return_counts=True)
+        bits = ((masks[:, None] >> np.arange(len(tags), dtype=np.uint64)) & np.uint64(1)).astype(np.int64)
+        return tags, ((bits * weights[:, None]).T @ bits).tolist()
@@ -1,5 +1,10 @@
 import difflib
+import time
+from functools import wraps
 from colorama import Fore, Back, Style
+from assistant.perf import MONITOR
+from assistant.models import ReadOnlyError
+from assistant.results import error, NOT_FOUND, INVALID, FAILED, READ_ONLY
 
 # Function to display a table of available commands
 
@@ -11,6 +16,24 @@ def display_commands_table():
             ("hello", "Greeting"),  # Greet the user
             ("exit", "Exit the program"),  # Exit the program
             ("close", "Close the program"),  # Close the program
+            # Check the integrity of the saved address book
+            ("verify", "Verify saved data"),
+            # Show command latency statistics
+            ("perf", "Command timings"),
+            # Show the size and memory footprint of the address book
+            ("stats", "Address book statistics"),
+            # Contacts changed or deleted since a time, for incremental sync
+            ("changes", "Changes since a time"),
+        ]),
+        ("Address books", [
+            ("use", "Switch to a book"),  # Switch to or create a book
+            ("books", "List books"),  # List the books of the workspace
+        ]),
+        ("Bulk edits (add --dry-run to preview)", [
+            ("tag-all", "Tag matching contacts"),  # Add a tag to every match of a query
+            ("untag-all", "Untag matching contacts"),  # Remove a tag from every match
+            ("delete-all", "Delete matching contacts"),  # Delete every match of a query
+            ("set-field-all", "Set a field of matches"),  # Set or clear a field of every match
         ]),
         ("Contact management", [
             ("add", "Add contact"),  # Add a new contact
@@ -18,6 +41,8 @@ def display_commands_table():
             ("delete", "Delete a contact"),  # Delete a contact
             ("search", "Search for a contact"),  # Search for a contact
             ("all", "Show all contacts"),  # Display all contacts
+            # Find and merge duplicate contacts
+            ("dedupe", "Find or merge duplicates"),
         ]),
         ("Phone management", [
             ("phone", "Show a contact's phone"),  # Show a contact's phone
@@ -29,12 +54,17 @@ def display_commands_table():
             ("add-address", "Add address"),  # Add an address to a contact
             ("edit-address", "Edit address"),  # Edit a contact's address
             ("remove-address", "Remove address"),  # Remove a contact's address
+            # Find contacts by city, street or postcode
+            ("address-search", "Search by address"),
+            ("cities", "Contacts per city"),  # Group contacts by city
         ]),
         ("Note management", [
             ("add-note", "Add a note"),  # Add a note to a contact
             ("edit-note", "Edit a note"),  # Edit a note
             ("remove-note", "Remove a note"),  # Remove a note
             ("show-note", "Show a note"),  # Display a note
+            # Search notes and tags
+            ("search-notes", "Search notes"),
         ]),
         ("Birthday management", [
             ("add-birthday", "Add a birthday"),  # Add a birthday to a contact
@@ -51,7 +81,9 @@ def display_commands_table():
             ("remove-tag", "remove tags"),  # Remove a tag from a contact
             ("show-tag", "show tags "),  # Show existing tags
             ("search-tag", "search tags"),  # Find a contact by tag
-            ("sort-notes", "sort notes")  # Sorts notes by tag
+            ("sort-notes", "sort notes"),  # Sorts notes by tag
+            ("tag-stats", "tag usage and co-occurrence"),  # Tag frequencies and co-occurrence matrix
+            ("related-tags", "tags used together")  # Tags that usually appear with a tag
         ])
     ]
 
@@ -70,15 +102,24 @@ def display_commands_table():
         print("\n")
 
 
-# Decorator to handle exceptions in functions
+# Decorator to turn exceptions into error results and time the call
 def exception_handler(func):
+    @wraps(func)
     def wrapper(*args, **kwargs):
+        wall, cpu = time.perf_counter(), time.process_time()
         try:
             return func(*args, **kwargs)
         except KeyError:
-            return 'Contact not found'
+            return error(NOT_FOUND, 'Contact not found')
+        except ValueError as e:
+            return error(INVALID, f"{e}")
+        except ReadOnlyError as e:
+            return error(READ_ONLY, f"{e}")
         except Exception as e:
-            return f"{e}"
+            return error(FAILED, f"{e}")
+        finally:
+            MONITOR.record_call(func.__name__, time.perf_counter() - wall,
+                                time.process_time() - cpu)
     return wrapper
 
 
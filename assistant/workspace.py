@@ -0,0 +1,109 @@
+import glob
+import os
+import re
+from collections import OrderedDict
+from assistant.replication import Journal
+from assistant.stats import estimate_size
+from assistant.storage import load_data, save_data
+
+BOOKS_DIR = os.environ.get('ASSISTANT_BOOKS_DIR', '.')
+DEFAULT_BOOK = 'addressbook'
+MEMORY_BUDGET_MB = float(os.environ.get('ASSISTANT_MEMORY_MB', '512'))
+BOOK_NAME = re.compile(r'[\w-]+')
+
+
+class Workspace:
+    """
+    A set of address books stored as <name>.pkl files in one directory.
+    Books are loaded on first use and kept in least-recently-used order.
+    When the loaded books exceed the memory budget, the least recently used
+    ones are saved and dropped; the current book is never evicted.
+    Changes to loaded books are journaled after every command, so that
+    followers can replay them and a crash loses nothing.
+    """
+
+    def __init__(self, directory=BOOKS_DIR, default=DEFAULT_BOOK, budget_mb=MEMORY_BUDGET_MB):
+        self.directory = directory
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.books = OrderedDict()
+        self.sizes = {}
+        self.journals = {}
+        # Version of every loaded book as last saved, None if never saved
+        self.saved = {}
+        self.current_name = default
+
+    def path(self, name):
+        return os.path.join(self.directory, f'{name}.pkl')
+
+    @property
+    def current(self):
+        return self.get(self.current_name)
+
+    def get(self, name):
+        """Returns a book, loading it from disk the first time it is used."""
+        if name in self.books:
+            self.books.move_to_end(name)
+            return self.books[name]
+        path = self.path(name)
+        book = load_data(path)
+        # Taken before the journal is replayed, so recovered changes get saved
+        self.saved[name] = book.version if os.path.exists(path) else None
+        self.journals[name] = Journal(book, path)
+        self.books[name] = book
+        self.sizes[name] = estimate_size(book)
+        self.evict(keep=name)
+        return book
+
+    def use(self, name):
+        """Makes the book current, creating it if it does not exist yet."""
+        if not BOOK_NAME.fullmatch(name):
+            raise ValueError('Book names may contain only letters, digits, "_" and "-"')
+        book = self.get(name)
+        self.current_name = name
+        self.evict()
+        return book
+
+    def available(self):
+        """Returns the names of the loaded books and of the books saved on disk."""
+        names = set(self.books)
+        for path in glob.glob(os.path.join(self.directory, '*.pkl')):
+            name = os.path.splitext(os.path.basename(path))[0]
+            if BOOK_NAME.fullmatch(name):
+                names.add(name)
+        return sorted(names)
+
+    def memory_used(self):
+        return sum(self.sizes.values())
+
+    def evict(self, keep=None):
+        """Saves and drops the least recently used books until the budget is met."""
+        if self.current_name in self.books:
+            self.sizes[self.current_name] = estimate_size(self.books[self.current_name])
+        for name in list(self.books):
+            if self.memory_used() <= self.budget:
+                break
+            if name in (keep, self.current_name):
+                continue
+            self.save(name)
+            del self.books[name], self.sizes[name], self.journals[name], self.saved[name]
+
+    def publish(self):
+        """Journals the changes made to the loaded books since the last call."""
+        for journal in self.journals.values():
+            journal.append()
+
+    def save(self, name):
+        """
+        Saves a loaded book and starts its journal afresh.
+        Books unchanged since they were loaded or last saved are skipped.
+        """
+        book = self.books[name]
+        if self.saved[name] == book.version:
+            return
+        save_data(book, self.path(name))
+        self.journals[name].reset()
+        self.saved[name] = book.version
+
+    def save_all(self):
+        for name in self.books:
+            self.save(name)
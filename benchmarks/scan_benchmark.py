@@ -0,0 +1,64 @@
+"""
+Benchmark of the contact and note scans on a large generated book.
+
+    python benchmarks/scan_benchmark.py --contacts 1000000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assistant.models import AddressBook, Record  # noqa: E402
+from assistant.scan import Scanner  # noqa: E402
+
+QUERIES = [('contacts', 'user12345'), ('contacts', '0501'), ('notes', 'vip'), ('notes', 'nothing-matches')]
+
+
+def build_book(count):
+    book = AddressBook()
+    for i in range(count):
+        record = Record(f'user{i}')
+        record.add_phone(f'050{i:07d}')
+        record.add_note(f'met at conference {i % 97}')
+        record.add_tags('vip' if i % 50 == 0 else 'team', f'group{i % 13}')
+        book.add_record(record)
+    return book
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args()
+
+    started = time.perf_counter()
+    book = build_book(options.contacts)
+    print(f'built {len(book)} contacts in {time.perf_counter() - started:.1f} s')
+
+    baseline = None
+    for workers in options.workers:
+        scanner = Scanner(workers=workers, threshold=0)
+        started = time.perf_counter()
+        scanner.search(book, 'warm-up')
+        setup = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(options.repeat):
+            results = [len(scanner.search(book, query, field)) for field, query in QUERIES]
+        elapsed = (time.perf_counter() - started) / options.repeat
+        # Interactive use: every search follows an edit
+        started = time.perf_counter()
+        for i in range(options.repeat):
+            book.data[f'user{i}'].edit_note(f'edited {workers} {i}')
+            scanner.search(book, 'user12345')
+        edited = (time.perf_counter() - started) / options.repeat
+        baseline = baseline or elapsed
+        print(f'workers={workers:<3} setup={setup:6.2f} s  queries={elapsed:6.3f} s  '
+              f'speedup={baseline / elapsed:4.1f}x  edit+search={edited:6.3f} s  matches={results}')
+        scanner.close()
+
+
+if __name__ == '__main__':
+    main()
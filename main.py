@@ -1,4 +1,11 @@
-from assistant.storage import load_data, save_data
+import argparse
+import sys
+from assistant import results
+from assistant.perf import MONITOR
+from assistant.render import RENDERERS
+from assistant.replication import Follower
+from assistant.storage import CODECS, DEFAULT_CODEC
+from assistant.workspace import Workspace
 from assistant.utils import display_commands_table, guess_command
 from assistant.core import (
     add_address, add_birthday_to_contact, add_contact, add_note,
@@ -6,7 +13,12 @@ from assistant.core import (
     edit_name, edit_note, remove_address, remove_email, remove_note,
     remove_phone, remove_tags, search_by_tag, search_contacts,
     show_all, show_birthday, set_email, edit_email, show_note, show_phone,
-    sort_notes_by_tags, upcoming_birthday
+    sort_notes_by_tags, upcoming_birthday, show_duplicates, merge_duplicates,
+    verify_storage, show_perf, configure_perf, show_stats,
+    search_address, contacts_per_city, use_book, list_books, search_all_books,
+    search_notes, show_tag_stats, related_tags,
+    tag_all, untag_all, delete_all, set_field_all, show_changes,
+    replication_status
 )
 from prompt_toolkit import prompt
 from prompt_toolkit.completion import Completer, Completion
@@ -15,11 +27,23 @@ from colorama import init, Fore, Style
 
 init(autoreset=True)
 
+# Commands that change a book, refused by followers
+WRITE_COMMANDS = {
+    "add", "edit-phone", "edit-name", "add-note", "edit-note", "remove-note", "delete",
+    "add-birthday", "remove-phone", "add-email", "edit-email", "remove-email",
+    "add-address", "edit-address", "remove-address", "add-tag", "remove-tag",
+    "tag-all", "untag-all", "delete-all", "set-field-all", "use",
+}
+
 
 class SmartBotCompleter(Completer):
-    def __init__(self, known_commands, address_book):
+    def __init__(self, known_commands, workspace):
         self.commands = known_commands
-        self.book = address_book
+        self.workspace = workspace
+
+    @property
+    def book(self):
+        return self.workspace.current
 
     def get_completions(self, document, complete_event):
         text = document.text_before_cursor.strip()
@@ -43,36 +67,31 @@ class SmartBotCompleter(Completer):
                     'add-note', 'edit-note', 'remove-note', 'show-note',
                     'add-birthday', 'show-birtday',
                     'add-email', 'edit-email', 'remove-email',
-                    'add-address', 'edit-addres', 'remove-address',
+                    'add-address', 'edit-address', 'remove-address',
                     'phone', 'add-tag', 'remove-tag'
                 ],
                 'phone': ['edit-phone', 'remove-phone'],
                 'email': ['edit-email', 'remove-email'],
-                'tag': ['add-tag', 'remove-tag', 'show-tag', 'search-tag']
+                'tag': ['add-tag', 'remove-tag', 'show-tag', 'search-tag', 'related-tags']
             }
 
             if command in contact_commands['name']:
-                for name in self.book.data:
-                    if name.lower().startswith(arg_prefix):
-                        yield Completion(name, start_position=-len(arg_prefix))
+                for name in self.book.indexes.with_prefix(arg_prefix):
+                    yield Completion(name, start_position=-len(arg_prefix))
 
             if command in contact_commands['phone']:
-                for record in self.book.data.values():
-                    for phone in record.phones:
-                        if phone.value.startswith(arg_prefix):
-                            yield Completion(phone.value, start_position=-len(arg_prefix))
+                for view in self.book.snapshot().views():
+                    for phone in view.phones:
+                        if phone.startswith(arg_prefix):
+                            yield Completion(phone, start_position=-len(arg_prefix))
 
             if command in contact_commands['email']:
-                for record in self.book.data.values:
-                    if record.email and record.email.value.lower().startwith(arg_prefix):
-                        yield Completion(record.email.value, start_position=-len(arg_prefix))
+                for view in self.book.snapshot().views():
+                    if view.email and view.email.lower().startswith(arg_prefix):
+                        yield Completion(view.email, start_position=-len(arg_prefix))
 
             if command in contact_commands['tag']:
-                all_tags = set()
-                for record in self.book.data.values():
-                    for tag in getattr(record, 'tag', []):
-                        if tag.lower().startswith(arg_prefix):
-                            all_tags.add(tag)
+                all_tags = [tag for tag in self.book.indexes.tags if tag.startswith(arg_prefix)]
                 for tag in sorted(all_tags):
                     yield Completion(tag, start_position=-len(arg_prefix))
 
@@ -90,50 +109,96 @@ class SmartBotCompleter(Completer):
                         yield Completion(suggestion, start_position=-len(arg_prefix))
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Console assistant bot')
+    parser.add_argument('--output', choices=sorted(RENDERERS), default='color',
+                        help='how command results are printed (default: color)')
+    parser.add_argument('--follow', metavar='PATH',
+                        help='serve a read-only copy of the book saved at PATH, kept up to date')
+    options = parser.parse_args(argv)
+    # Checked before any editing, saving only happens on exit
+    if DEFAULT_CODEC not in CODECS:
+        parser.error(f"ASSISTANT_SNAPSHOT_CODEC must be one of: {', '.join(CODECS)}, not '{DEFAULT_CODEC}'")
+    return options
+
+
+def read_commands(command_completer, history):
+    """
+    Yields the commands typed by the user.
+    When input is not a terminal, commands are read line by line from stdin.
+    """
+    if not sys.stdin.isatty():
+        for line in sys.stdin:
+            yield line.rstrip('\n')
+        yield 'exit'
+        return
+    while True:
+        yield prompt("Enter command:", completer=command_completer, history=history,
+                     complete_while_typing=True)
+
+
+def main(argv=None):
     """
     The main function that runs the console assistant bot.
     Handles user input, processes commands, and interacts with the AddressBook.
     """
+    options = parse_args(argv)
+    render = RENDERERS[options.output]
+    interactive = options.output == 'color'
 
-    # Load the address book data from a file or create a new one if the file doesn't exist
-    book = load_data()
+    output_size = 0
+
+    def emit(result):
+        nonlocal output_size
+        text = render(result)
+        output_size += len(text)
+        print(text)
+
+    # Address books are loaded from files on first use or created if they don't exist.
+    # A follower serves one book saved by another instance instead.
+    workspace = Follower(options.follow) if options.follow else Workspace()
 
     # List of known commands supported by the bot
     known_commands = [
         "hello",
         "add", "search",
         "edit-name",
-        "add-note", "edit-note", "remove-note", "show-note",
+        "add-note", "edit-note", "remove-note", "show-note", "search-notes",
         "all",
         "delete",
         "add-birthday", "show-birthday",
         "add-email", "edit-email", "remove-email",
         "add-address", "edit-address", "remove-address",
+        "address-search", "cities",
         "birthdays",
         "edit-phone", "remove-phone",
         "phone",
         "add-tag", "remove-tag", "search-tag", "sort-notes",
+        "tag-stats", "related-tags",
+        "tag-all", "untag-all", "delete-all", "set-field-all",
+        "changes", "lag",
+        "dedupe", "verify", "perf", "stats",
+        "use", "books",
         "exit", "close"
     ]
 
-    command_completer = SmartBotCompleter(known_commands, book)
+    command_completer = SmartBotCompleter(known_commands, workspace)
     history = InMemoryHistory()
 
     # Display a welcome message and the list of available commands
-    print(Fore.BLUE + 'Hi! I am a console assistant bot' + Style.RESET_ALL)
-    print()
-    display_commands_table()
+    if interactive:
+        print(Fore.BLUE + 'Hi! I am a console assistant bot' + Style.RESET_ALL)
+        print()
+        display_commands_table()
 
     # Main loop to process user commands
-    while True:
-        user_input = prompt("Enter command:", completer=command_completer, history=history,
-                            complete_while_typing=True)
-        print()
+    for user_input in read_commands(command_completer, history):
+        if interactive:
+            print()
 
         if not user_input.strip():
             # Handle empty input
-            print(Fore.YELLOW + 'Empty input. Please try again.' + Style.RESET_ALL)
+            emit(results.error(results.MISSING_ARGUMENTS, 'Empty input. Please try again.'))
             continue
 
         command = None
@@ -141,24 +206,33 @@ def main():
         guess_result, args, _ = guess_command(user_input, known_commands)
 
         if guess_result is None:
-            print(Fore.RED + 'Unknow command. Please try again.' + Style.RESET_ALL)
+            emit(results.error(results.UNKNOWN_COMMAND, 'Unknow command. Please try again.'))
+            continue
 
-        command = guess_result
+        command = guess_result.lower()
+        merge = command == 'dedupe' and bool(args) and args[0].lower() == 'merge'
+        if options.follow:
+            # The book refuses changes too; this only gives a clearer message
+            if command in WRITE_COMMANDS or merge:
+                emit(results.error(results.READ_ONLY, f"'{command}' is not allowed on a read-only follower"))
+                continue
+            # Released after the command, the book must not change while it runs
+            workspace.lock.acquire()
+        book = workspace.current
+        output_size = 0
+        started = MONITOR.start()
 
         def require_args(min_args, func):
             try:
                 if len(args) >= min_args:
-                    print(func())
+                    emit(func())
                 else:
-                    print(Fore.RED + 'Not enough arguments.' + Style.RESET_ALL)
+                    emit(results.error(results.MISSING_ARGUMENTS, 'Not enough arguments.'))
             except Exception as e:
-                print((Fore.RED + f'[ERROR] {e}' + Style.RESET_ALL))
-
-        if command:
-            command = command.lower()
+                emit(results.error(results.FAILED, f'[ERROR] {e}'))
 
         match command:
-            case "hello": print("Hello! How can I help you?" + Style.RESET_ALL)
+            case "hello": emit(results.info("Hello! How can I help you?"))
             case 'add': require_args(2, lambda: add_contact(book, args[0], args[1]))
             case 'edit-phone': require_args(3, lambda: change_contact(book, *args[:3]))
             case "edit-name": require_args(2, lambda: edit_name(book, *args[:2]))
@@ -166,13 +240,17 @@ def main():
             case "edit-note": require_args(2, lambda: edit_note(book, args[0], ' '.join(args[1:])))
             case "remove-note": require_args(1, lambda: remove_note(book, args[0]))
             case "show-note": require_args(1, lambda: show_note(book, args[0]))
+            case "search-notes": require_args(1, lambda: search_notes(book, ' '.join(args)))
             case "phone": require_args(1, lambda: show_phone(book, args[0]))
+            case "search" if '--all-books' in args:
+                args.remove('--all-books')
+                require_args(1, lambda: search_all_books(workspace, args[0]))
             case "search": require_args(1, lambda: search_contacts(book, args[0]))
-            case "all": print(show_all(book))
+            case "all": emit(show_all(book))
             case "delete": require_args(1, lambda: delete_contact(book, args[0]))
             case "add-birthday": require_args(2, lambda: add_birthday_to_contact(book, args[0], args[1]))
             case "show-birthday": require_args(1, lambda: show_birthday(book, args[0]))
-            case "birthdays": print(upcoming_birthday(book))
+            case "birthdays": emit(upcoming_birthday(book))
             case "remove-phone": require_args(2, lambda: remove_phone(book, args[0], args[1]))
             case "add-email": require_args(2, lambda: set_email(book, args[0], args[1]))
             case "edit-email": require_args(2, lambda: edit_email(book, args[0], args[1]))
@@ -180,15 +258,46 @@ def main():
             case "add-address": require_args(2, lambda: add_address(book, args[0], ' '.join(args[1:])))
             case "edit-address": require_args(2, lambda: edit_address(book, args[0], ' '.join(args[1:])))
             case "remove-address": require_args(1, lambda: remove_address(book, args[0]))
+            case "address-search": require_args(1, lambda: search_address(book, ' '.join(args)))
+            case "cities": emit(contacts_per_city(book, ' '.join(args)))
             case "add-tag": require_args(2, lambda: add_tags(book, args[0], *args[1:]))
             case "remove-tag": require_args(2, lambda: remove_tags(book, args[0], args[1]))
             case "search-tag": require_args(1, lambda: search_by_tag(book, args[0]))
-            case "sort-notes": print(sort_notes_by_tags(book))
+            case "sort-notes": emit(sort_notes_by_tags(book))
+            case "tag-stats": emit(show_tag_stats(book, *args[:1]))
+            case "related-tags": require_args(1, lambda: related_tags(book, args[0]))
+            case "tag-all" | "untag-all" | "delete-all" | "set-field-all":
+                dry_run = '--dry-run' in args
+                args = [arg for arg in args if arg != '--dry-run']
+                match command:
+                    case "tag-all": require_args(2, lambda: tag_all(book, args[0], args[1], dry_run))
+                    case "untag-all": require_args(2, lambda: untag_all(book, args[0], args[1], dry_run))
+                    case "delete-all": require_args(1, lambda: delete_all(book, args[0], dry_run))
+                    case "set-field-all":
+                        require_args(3, lambda: set_field_all(book, args[0], args[1], ' '.join(args[2:]), dry_run))
+            case "changes":
+                flags = dict(zip(args[::2], args[1::2]))
+                emit(show_changes(book, flags.get('--since'), flags.get('--export')))
+            case "lag": emit(replication_status(workspace))
+            case "dedupe" if merge:
+                emit(merge_duplicates(book, *args[1:]))
+            case "dedupe": emit(show_duplicates(book))
+            case "verify": emit(verify_storage(*(args[:1] or [workspace.path(workspace.current_name)])))
+            case "perf" if args: emit(configure_perf(MONITOR, args[0].lower(), *args[1:2]))
+            case "perf": emit(show_perf(MONITOR))
+            case "stats": emit(show_stats(book, workspace.path(workspace.current_name), trace='--trace' in args))
+            case "use": require_args(1, lambda: use_book(workspace, args[0]))
+            case "books": emit(list_books(workspace))
             case "exit" | "close":
-                save_data(book)
-                print(Fore.GREEN + "Goodbye!" + Style.RESET_ALL)
+                workspace.save_all()
+                emit(results.ok("Goodbye!"))
                 break
-            case _: print(Fore.RED + 'Unknown or unsupported command.' + Style.RESET_ALL)
+            case _: emit(results.error(results.UNKNOWN_COMMAND, 'Unknown or unsupported command.'))
+
+        workspace.publish()
+        MONITOR.finish(command, started, len(args), output_size)
+        if options.follow:
+            workspace.lock.release()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+TIMEOUT = 30
+# Seconds between two checks of the journal by the followers under test
+INTERVAL = '0.05'
+
+
+class Bot:
+    """A running instance of the bot, driven line by line over pipes with --output json."""
+
+    def __init__(self, directory, *options, interval=INTERVAL):
+        env = dict(os.environ, ASSISTANT_BOOKS_DIR=directory, ASSISTANT_FOLLOW_INTERVAL=interval,
+                   PYTHONUNBUFFERED='1')
+        self.process = subprocess.Popen(
+            [sys.executable, MAIN, '--output', 'json', *options],
+            cwd=directory, env=env, text=True, encoding='utf-8',
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            self.lines.put(line)
+
+    def send(self, command):
+        """Sends one command and returns its result."""
+        self.process.stdin.write(command + '\n')
+        self.process.stdin.flush()
+        return json.loads(self.lines.get(timeout=TIMEOUT))
+
+    def sync(self):
+        # Changes are journaled after a command's result is printed;
+        # once the next command answers, the previous batch is on disk.
+        self.send('hello')
+
+    def names(self):
+        return sorted(record['name'] for record in self.send('all').get('records', []))
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait(timeout=TIMEOUT)
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait(timeout=TIMEOUT)
+
+
+class FollowerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'addressbook.pkl')
+        seed = Bot(self.directory.name)
+        seed.send('add ann 0501234567')
+        seed.send('add bob 0507654321')
+        seed.close()
+        self.primary = Bot(self.directory.name)
+        self.addCleanup(self.primary.kill)
+        self.primary.sync()
+        self.follower = Bot(self.directory.name, '--follow', self.path)
+        self.addCleanup(self.follower.kill)
+
+    def status(self, follower=None):
+        return (follower or self.follower).send('lag')['data']
+
+    def wait_for(self, condition):
+        """Waits for the follower to catch up until the condition holds."""
+        deadline = time.monotonic() + TIMEOUT
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, 'the follower did not catch up')
+            time.sleep(0.02)
+
+    def test_changes_are_applied_incrementally(self):
+        self.assertEqual(self.follower.names(), ['ann', 'bob'])
+        before = self.status()
+
+        self.primary.send('add carl 0501112233')
+        self.primary.sync()
+        self.wait_for(lambda: self.follower.names() == ['ann', 'bob', 'carl'])
+
+        self.primary.send('add-tag carl friends')
+        self.primary.sync()
+        self.wait_for(lambda: self.status()['batches_applied'] == before['batches_applied'] + 2)
+        after = self.status()
+        self.assertEqual(after['snapshot_reloads'], before['snapshot_reloads'])
+        self.assertEqual(after['behind_bytes'], 0)
+        self.assertEqual(self.follower.send('search-tag friends')['records'][0]['name'], 'carl')
+
+    def test_renames_and_deletes_are_replicated(self):
+        self.primary.send('edit-name ann anna')
+        self.primary.send('delete bob')
+        self.primary.sync()
+        self.wait_for(lambda: self.follower.names() == ['anna'])
+        self.assertEqual(self.status()['snapshot_reloads'], 1)
+
+    def test_lag_reports_batches_not_applied_yet(self):
+        idle = Bot(self.directory.name, '--follow', self.path, interval='3600')
+        self.addCleanup(idle.kill)
+        before = self.status(idle)
+        self.primary.send('add carl 0501112233')
+        self.primary.sync()
+
+        status = self.status(idle)
+        self.assertGreater(status['behind_bytes'], 0)
+        self.assertEqual(status['batches_applied'], before['batches_applied'])
+        self.assertEqual(status['journal_offset'], before['journal_offset'])
+        self.assertEqual(idle.names(), ['ann', 'bob'])
+
+    def test_write_commands_are_refused(self):
+        for command in ('add dan 0501234567', 'edit-name ann anna', 'dedupe Merge'):
+            result = self.follower.send(command)
+            self.assertEqual(result['status'], 'error')
+            self.assertEqual(result['code'], 'read_only')
+        self.assertEqual(self.follower.names(), ['ann', 'bob'])
+
+    def test_killed_primary_recovers_from_journal(self):
+        self.primary.send('add carl 0501112233')
+        self.primary.send('delete bob')
+        self.primary.sync()
+        self.primary.kill()
+        self.assertTrue(os.path.exists(self.path + '.journal'))
+
+        restarted = Bot(self.directory.name)
+        self.addCleanup(restarted.kill)
+        self.assertEqual(restarted.names(), ['ann', 'carl'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+from assistant.models import AddressBook, Record
+from assistant.storage import save_data
+from assistant.workspace import Workspace
+
+
+class CleanBooksTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for name in ('addressbook', 'other'):
+            book = AddressBook()
+            book.add_record(Record('ann'))
+            save_data(book, os.path.join(self.directory.name, f'{name}.pkl'))
+
+    def files(self):
+        return {name: os.stat(os.path.join(self.directory.name, name)).st_mtime_ns
+                for name in os.listdir(self.directory.name)}
+
+    def test_unchanged_books_are_not_written(self):
+        before = self.files()
+        workspace = Workspace(self.directory.name, budget_mb=0)
+        for name in workspace.available():
+            workspace.use(name)
+        workspace.publish()
+        workspace.save_all()
+        self.assertEqual(self.files(), before)
+
+    def test_changed_books_are_saved(self):
+        workspace = Workspace(self.directory.name)
+        workspace.use('other').add_record(Record('bob'))
+        workspace.get('addressbook')
+        workspace.publish()
+        self.assertIn('other.pkl.journal', self.files())
+        self.assertNotIn('addressbook.pkl.journal', self.files())
+        workspace.save_all()
+        self.assertEqual(sorted(Workspace(self.directory.name).get('other').data), ['ann', 'bob'])
+
+
+if __name__ == '__main__':
+    unittest.main()